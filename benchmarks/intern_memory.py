@@ -0,0 +1,96 @@
+"""
+Memory of decoded load_points results with and without value interning.
+
+Decodes a synthetic query result (default 1M rows over 500 symbols) with InfluxClient._decode_points and reports
+memory retained by the decoded measurements, counting each object once, so values shared between rows by interning
+are only counted for their first row. No database is needed.
+
+    python benchmarks/intern_memory.py --rows 1000000 --symbols 500
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from enum import Enum
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pinform import Measurement  # noqa: E402
+from pinform.client import InfluxClient  # noqa: E402
+from pinform.fields import FloatField, EnumStringField  # noqa: E402
+from pinform.tags import Tag  # noqa: E402
+from pinform.utils import ValueInterner  # noqa: E402
+
+
+class Side(Enum):
+    BUY = 'buy'
+    SELL = 'sell'
+
+
+class Trade(Measurement):
+    class Meta:
+        measurement_name = 'trade'
+
+    symbol = Tag(null=False)
+    exchange = Tag(null=False)
+    price = FloatField(null=False)
+    side = EnumStringField(enum=Side, null=False)
+
+
+def make_points(rows: int, symbols: int):
+    values = [{'time': '2020-01-01T00:%02d:%02dZ' % (i // 60 % 60, i % 60), 'symbol': 'SYM%04d' % (i % symbols),
+               'exchange': 'EX%d' % (i % 4), 'price': float(i), 'side': 'buy' if i % 2 else 'sell'} for i in range(rows)]
+    # decode from json, like query results, so every row gets its own string objects
+    return json.loads(json.dumps(values))
+
+
+def get_retained_size(items) -> int:
+    seen = set()
+    total = sys.getsizeof(items)
+    for item in items:
+        # noinspection PyProtectedMember
+        for obj in (item, item.__dict__, item.time_point, item._data, *item._data.values()):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+    return total
+
+
+def measure(client: InfluxClient, points, **decode_kwargs):
+    gc.collect()
+    start = time.perf_counter()
+    items = client._decode_points(points, Trade, **decode_kwargs)
+    elapsed = time.perf_counter() - start
+    return get_retained_size(items), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=500)
+    args = parser.parse_args()
+
+    # the client is never connected, only its decoder is used
+    client = InfluxClient.__new__(InfluxClient)
+    points = make_points(args.rows, args.symbols)
+
+    results = []
+    for label, interner, decode_kwargs in (('no interning', None, {'intern_values': False}),
+                                           ('interning', ValueInterner(), {'intern_values': True}),
+                                           ('interning + enum members', ValueInterner(), {'intern_values': True, 'decode_enums': True})):
+        client.interner = interner
+        allocated, elapsed = measure(client, points, **decode_kwargs)
+        results.append((label, allocated, elapsed))
+
+    baseline = results[0][1]
+    print('{rows} rows, {symbols} symbols'.format(rows=args.rows, symbols=args.symbols))
+    for label, allocated, elapsed in results:
+        print('{label:<26} {mb:8.1f} MB  {per_row:6.1f} B/row  {change:+6.1f}%  {elapsed:6.2f}s'.format(
+            label=label, mb=allocated / 1e6, per_row=allocated / args.rows,
+            change=(allocated - baseline) * 100.0 / baseline, elapsed=elapsed))
+
+
+if __name__ == '__main__':
+    main()
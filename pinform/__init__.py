@@ -1,17 +1,28 @@
 import datetime
-from pandas import DataFrame
-from typing import Dict, Any, Tuple, List, Optional
-from .fields import Field
+from enum import Enum
+from typing import Dict, Any, Tuple, List, Optional, TYPE_CHECKING
+from .fields import Field, FieldType, MultipleChoiceStringField, EnumStringField, MultipleChoiceIntegerField, \
+    EnumIntegerField
 from .tags import Tag
-from collections import defaultdict
 import six
 import re
 from .utils import dromedary_to_underline, underline_to_dromedary
 
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
 
 name = "pinform"
 
 
+def __getattr__(attr_name: str):
+    # pandas is optional and only imported on first use of DataFrame features
+    if attr_name == 'DataFrame':
+        from pandas import DataFrame
+        return DataFrame
+    raise AttributeError("module 'pinform' has no attribute '" + attr_name + "'")
+
+
 class MeasurementNameComponent(object):
 
     # noinspection PyProtectedMember
@@ -87,13 +98,19 @@ class MeasurementMeta(type):
 
             for field_key in model_element_names:
                 if field_key not in init_kwargs.keys():
-                    _setattr(instance_self, field_key, None)
+                    if field_key in model_name_components:
+                        # name components are optional until the measurement name is resolved
+                        instance_self._data[field_key] = None
+                    else:
+                        _setattr(instance_self, field_key, None)
 
             for key, value in init_kwargs.items():
                 if key in model_field_names:
                     _setattr(instance_self, key, value)
                 elif key in model_tag_names:
                     _setattr(instance_self, key, value)
+                elif key in model_name_components:
+                    _setattr(instance_self, key, value)
                 elif key == "time_point":
                     if isinstance(value, datetime.datetime):
                         _setattr(instance_self, key, value)
@@ -254,12 +271,30 @@ class Measurement(six.with_metaclass(MeasurementMeta)):
         for name_tag in name_tags:
             if name_components is None:
                 raise Exception('Measurement name resolution needs a component named ' + name_tag + ' but null name components is provided')
-            if name_tag in name_components.keys():
-                measurement_name.replace('(' + name_tag + ')', name_components[name_tag])
+            if name_components.get(name_tag) is not None:
+                measurement_name = measurement_name.replace('(' + name_tag + ')', str(name_components[name_tag]))
             else:
                 raise Exception('Tag with name ' + name_tag + ' not provided in name resolution tags for resolving dynamic measurement name')
         return measurement_name
 
+    @staticmethod
+    def get_value_names(cls) -> List[str]:
+        """
+        Names of fields, tags and name components of a measurement class in schema order, cached per class.
+        """
+        value_names = _value_names_cache.get(cls)
+        if value_names is None:
+            type_dicts = cls.__dict__
+            value_names = [v.name for v in type_dicts.values() if isinstance(v, (Field, Tag, MeasurementNameComponent))]
+            _value_names_cache[cls] = value_names
+        return value_names
+
+    def __reduce__(self):
+        # only the values in schema order are pickled, not the keys of the _data dict
+        value_names = Measurement.get_value_names(type(self))
+        # noinspection PyProtectedMember
+        return _rebuild_measurement, (type(self), self.time_point, tuple([self._data.get(n) for n in value_names]))
+
     def get_measurement_name(self) -> str:
         return Measurement.get_name(type(self), name_components=self.get_name_component_values_as_dict())
 
@@ -281,11 +316,26 @@ class Measurement(six.with_metaclass(MeasurementMeta)):
             "measurement": measurement_name,
             "tags": self.get_tag_values_as_dict(),
             "time": str(self.time_point),
-            "fields": self.get_field_values_as_dict()
+            "fields": {f_name: (value.value if isinstance(value, Enum) else value) for f_name, value in self.get_field_values_as_dict().items()}
         }
 
 
+_value_names_cache = {}  # type: Dict[type, List[str]]
+
+
+def _rebuild_measurement(cls, time_point: datetime.datetime, values: Tuple[Any, ...]) -> Measurement:
+    """
+    Creates a measurement instance from values in schema order without validating them again.
+    """
+    instance = cls.__new__(cls)
+    instance._data = dict(zip(Measurement.get_value_names(cls), values))
+    instance.time_point = time_point
+    return instance
+
+
 class MeasurementUtils:
+    # cache of field/tag name to dataframe column name for each measurement class
+    _dataframe_column_names = {}  # type: Dict[type, Dict[str, str]]
 
     @staticmethod
     def field_to_dataframe_column_name(field_name: str) -> str:
@@ -296,7 +346,59 @@ class MeasurementUtils:
         return dromedary_to_underline(column_name)
 
     @staticmethod
-    def to_dataframe(items: List[Measurement]) -> DataFrame:
+    def get_dataframe_column_names(cls) -> Dict[str, str]:
+        column_names = MeasurementUtils._dataframe_column_names.get(cls)
+        if column_names is None:
+            column_names = {}
+            for f_name in Measurement.get_fields(cls).keys():
+                column_names[f_name] = MeasurementUtils.field_to_dataframe_column_name(f_name)
+            for t_name in Measurement.get_tags(cls).keys():
+                column_names[t_name] = MeasurementUtils.field_to_dataframe_column_name(t_name)
+            MeasurementUtils._dataframe_column_names[cls] = column_names
+        return column_names
+
+    @staticmethod
+    def field_values_to_array(field: Field, values: List[Any], null: bool = False):
+        """
+        Converts values of a field to a typed array, using nullable extension dtypes for nullable integer and boolean
+        fields and category dtype for fields with a known set of options. With null set, values may contain None
+        even if the field is not nullable.
+        """
+        import numpy as np
+        import pandas
+        count = len(values)
+        if isinstance(field, (MultipleChoiceStringField, EnumStringField, MultipleChoiceIntegerField, EnumIntegerField)):
+            if isinstance(field, (EnumStringField, EnumIntegerField)):
+                values = [v.value if isinstance(v, Enum) else v for v in values]
+            return pandas.Categorical(values, categories=sorted(field.options))
+
+        null = null or field.null
+        if field.field_type == FieldType.FLOAT:
+            if not null:
+                return np.fromiter(values, dtype=np.float64, count=count)
+            return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=count)
+        elif field.field_type == FieldType.INTEGER or field.field_type == FieldType.BOOLEAN:
+            dtype = np.int64 if field.field_type == FieldType.INTEGER else np.bool_
+            if not null:
+                return np.fromiter(values, dtype=dtype, count=count)
+            buffer = np.zeros(count, dtype=dtype)
+            mask = np.zeros(count, dtype=np.bool_)
+            for i, v in enumerate(values):
+                if v is None:
+                    mask[i] = True
+                else:
+                    buffer[i] = v
+            if field.field_type == FieldType.INTEGER:
+                return pandas.arrays.IntegerArray(buffer, mask)
+            return pandas.arrays.BooleanArray(buffer, mask)
+        else:
+            buffer = np.empty(count, dtype=object)
+            buffer[:] = values
+            return buffer
+
+    @staticmethod
+    def to_dataframe(items: List[Measurement]) -> 'DataFrame':
+        from pandas import DataFrame
         if len(items) == 0:
             return DataFrame()
         item0 = items[0]
@@ -308,37 +410,51 @@ class MeasurementUtils:
                 raise Exception(type_error)
             if type(item) != item_type:
                 raise Exception("Items passed to create dataframe must have same type")
-        m_fields = Measurement.get_fields(type(item0))
-        m_tags = Measurement.get_tags(type(item0))
-
-        field_names = []
-        tag_names = []
-        column_names = []
-        for f_name, field in m_fields.items():
-            column_names.append(MeasurementUtils.field_to_dataframe_column_name(field.name))
-            field_names.append(field.name)
-        for t_name, tag in m_tags.items():
-            column_names.append(MeasurementUtils.field_to_dataframe_column_name(tag.name))
-            tag_names.append(tag.name)
-
-        data_points = defaultdict(list)
-        for item in items:
-            item_fields = item.get_field_values_as_dict()
-            item_tags = item.get_tag_values_as_dict()
+        # noinspection PyProtectedMember
+        items_data = [item._data for item in items]
+        values = {name: [d[name] for d in items_data] for name in MeasurementUtils.get_dataframe_column_names(item_type).keys()}
+        return MeasurementUtils.columns_to_dataframe(item_type, [item.time_point for item in items], values)
 
-            data_points["time_point"].append(item.time_point)
-            for f_name in field_names:
-                data_points[f_name].append(item_fields.get(f_name))
-            for t_name in tag_names:
-                data_points[t_name].append(item_tags.get(t_name))
+    @staticmethod
+    def columns_to_dataframe(measurement_type: type, time_points: List[datetime.datetime], values: Dict[str, List[Any]]) -> 'DataFrame':
+        """
+        DataFrame with to_dataframe columns from lists of values by field and tag name.
+        """
+        from pandas import DataFrame, Categorical, Index
+        column_names = MeasurementUtils.get_dataframe_column_names(measurement_type)
+        columns = {}
+        for f_name, field in Measurement.get_fields(measurement_type).items():
+            columns[column_names[f_name]] = MeasurementUtils.field_values_to_array(field, values[f_name])
+        for t_name in Measurement.get_tags(measurement_type).keys():
+            columns[column_names[t_name]] = Categorical(values[t_name])
+
+        index = Index(time_points, name="time_point")
+        return DataFrame(columns, index=index)
 
-        df_result = DataFrame.from_dict(data=data_points, orient='columns')
-        df_result.set_index("time_point", drop=True, inplace=True)
-        df_result.columns = [MeasurementUtils.field_to_dataframe_column_name(col) for col in df_result.columns]
-        return df_result
+    @staticmethod
+    def aligned_to_dataframe(rows: List[Tuple[Any, ...]], measurement_types: List[type]) -> 'DataFrame':
+        """
+        Converts aligned rows of (time_point, item of each measurement type or None) to a DataFrame with
+        (measurement class name, column name) columns.
+        """
+        from pandas import DataFrame, Categorical, Index
+        columns = {}
+        for m_index, m_type in enumerate(measurement_types):
+            # noinspection PyProtectedMember
+            items_data = [row[m_index + 1]._data if row[m_index + 1] is not None else None for row in rows]
+            has_missing = any(d is None for d in items_data)
+            column_names = MeasurementUtils.get_dataframe_column_names(m_type)
+            for f_name, field in Measurement.get_fields(m_type).items():
+                values = [d[f_name] if d is not None else None for d in items_data]
+                columns[(m_type.__name__, column_names[f_name])] = MeasurementUtils.field_values_to_array(field, values, null=has_missing)
+            for t_name in Measurement.get_tags(m_type).keys():
+                columns[(m_type.__name__, column_names[t_name])] = Categorical([d[t_name] if d is not None else None for d in items_data])
+
+        index = Index([row[0] for row in rows], name="time_point")
+        return DataFrame(columns, index=index)
 
     @staticmethod
-    def from_dataframe(df: DataFrame, cls: type) -> List[Measurement]:
+    def from_dataframe(df: 'DataFrame', cls: type) -> List[Measurement]:
         assert df is not None, "Null DataFrame passed to create list of measurements"
         measurements = []
         m_fields = Measurement.get_fields(cls=cls)
@@ -352,12 +468,13 @@ class MeasurementUtils:
         for tag_name, t in m_tags.items():
             tag_names.append(tag_name)
 
+        column_names = MeasurementUtils.get_dataframe_column_names(cls)
         for i in df.index:
             data_points = {}
             for f_name in field_names:
-                data_points[f_name] = df.at[i, MeasurementUtils.field_to_dataframe_column_name(f_name)]
+                data_points[f_name] = df.at[i, column_names[f_name]]
             for t_name in tag_names:
-                data_points[t_name] = df.at[i, MeasurementUtils.field_to_dataframe_column_name(t_name)]
+                data_points[t_name] = df.at[i, column_names[t_name]]
             data_points['time_point'] = i
             measurements.append(cls(**data_points))
 
@@ -0,0 +1,87 @@
+"""
+Streaming copy of a measurement between databases, retention policies or measurement names.
+
+Example:
+    python -m pinform.backfill --model mypkg.models:OHLC --src-database olddb --dst-database newdb \
+        --start 2019-01-01T00:00:00 --end 2020-01-01T00:00:00 --chunk-interval 6h --checkpoint ohlc-copy.json
+"""
+import argparse
+import datetime
+import importlib
+import logging
+import sys
+import os
+from typing import List, Optional, Dict
+
+from .client import InfluxClient, interval_to_timedelta
+from .ingest import load_model
+
+logger = logging.getLogger('pinform')
+
+
+def parse_key_values(values: Optional[List[str]]) -> Optional[Dict[str, str]]:
+    if values is None:
+        return None
+    result = {}
+    for value in values:
+        if '=' not in value:
+            raise Exception('Invalid key=value argument ' + str(value))
+        key, item_value = value.split('=', 1)
+        result[key] = item_value
+    return result
+
+
+def load_function(function_path: str):
+    module_name, function_name = function_path.split(':', 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m pinform.backfill', description='Copy a measurement between InfluxDB databases')
+    parser.add_argument('--model', required=True, help='measurement class as package.module:ClassName')
+    for side in ('src', 'dst'):
+        parser.add_argument('--' + side + '-host', default=None, help='defaults to localhost for src and src host for dst')
+        parser.add_argument('--' + side + '-port', type=int, default=None)
+        parser.add_argument('--' + side + '-username', default=None)
+        parser.add_argument('--' + side + '-password', default=None)
+        parser.add_argument('--' + side + '-database', default=None)
+        parser.add_argument('--' + side + '-name-component', action='append', default=None, metavar='NAME=VALUE',
+                            help='name component of the ' + side + ' measurement name, can be repeated')
+    parser.add_argument('--dst-retention-policy', default=None)
+    parser.add_argument('--tag', action='append', default=None, metavar='NAME=VALUE', help='copy only points with this tag value')
+    parser.add_argument('--start', required=True, help='start time, ISO format, UTC if no offset is given')
+    parser.add_argument('--end', required=True, help='end time (exclusive), ISO format, UTC if no offset is given')
+    parser.add_argument('--chunk-interval', default='1h', help='time span of each read, e.g. 30m, 6h, 1d')
+    parser.add_argument('--read-concurrency', type=int, default=2)
+    parser.add_argument('--write-concurrency', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=5000, help='maximum points per write request')
+    parser.add_argument('--transform', default=None, help='function applied to each chunk, as package.module:function')
+    parser.add_argument('--checkpoint', default=None, help='json file to resume an interrupted copy from')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    sys.path.insert(0, os.getcwd())
+
+    src = InfluxClient(host=args.src_host or 'localhost', port=args.src_port or 8086, username=args.src_username,
+                       password=args.src_password, database_name=args.src_database or 'default')
+    dst = InfluxClient(host=args.dst_host or args.src_host or 'localhost', port=args.dst_port or args.src_port or 8086,
+                       username=args.dst_username or args.src_username, password=args.dst_password or args.src_password,
+                       database_name=args.dst_database or args.src_database or 'default')
+
+    def report(cursor: datetime.datetime, written: int):
+        logger.info('copied {written} points up to {cursor}'.format(written=written, cursor=cursor))
+
+    written = src.copy(load_model(args.model),
+                       time_range=(datetime.datetime.fromisoformat(args.start), datetime.datetime.fromisoformat(args.end)),
+                       dst=dst, name_components=parse_key_values(args.src_name_component),
+                       dst_name_components=parse_key_values(args.dst_name_component), tags=parse_key_values(args.tag),
+                       transform=load_function(args.transform) if args.transform is not None else None,
+                       chunk_interval=interval_to_timedelta(args.chunk_interval), read_concurrency=args.read_concurrency,
+                       write_concurrency=args.write_concurrency, write_batch_size=args.batch_size,
+                       dst_retention_policy=args.dst_retention_policy, checkpoint_path=args.checkpoint, progress=report)
+    logger.info('done: copied {written} points'.format(written=written))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Dict, Tuple, Optional, Any, List
+
+from . import Measurement
+from .utils import to_utc
+
+
+class LatestValueCache:
+    """
+    Latest point of each series, keyed by resolved measurement name and tag set, together with the monotonic time it
+    was last confirmed from database or from a saved point. Only measurement names that were warmed or looked up are
+    tracked, so saving points of other measurements does not grow the cache. Tag sets found to have no points are
+    remembered as misses for max_age as well, so repeated lookups of them do not query the database each time.
+
+    Points are copied when stored and when returned, so changing a saved or returned instance does not change the
+    cached point.
+    """
+
+    def __init__(self, max_age: Optional[float] = 60.0):
+        self.max_age = max_age
+        self._entries = {}  # type: Dict[str, Dict[Tuple[Tuple[str, str], ...], Tuple[Measurement, float]]]
+        self._misses = {}  # type: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(item: Measurement) -> Measurement:
+        rebuild, args = item.__reduce__()
+        return rebuild(*args)
+
+    @staticmethod
+    def get_series_key(tags: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((t_name, t_value) for t_name, t_value in tags.items() if t_value is not None))
+
+    def track(self, measurement_name: str):
+        with self._lock:
+            self._entries.setdefault(measurement_name, {})
+
+    def is_tracked(self, measurement_name: str) -> bool:
+        return measurement_name in self._entries
+
+    def update(self, item: Measurement, measurement_name: Optional[str] = None, confirmed_at: Optional[float] = None):
+        measurement_name = measurement_name if measurement_name is not None else item.get_measurement_name()
+        series = self._entries.get(measurement_name)
+        if series is None:
+            return
+        key = LatestValueCache.get_series_key(item.get_tag_values_as_dict())
+        confirmed_at = confirmed_at if confirmed_at is not None else time.monotonic()
+        with self._lock:
+            entry = series.get(key)
+            if entry is None or to_utc(item.time_point) >= to_utc(entry[0].time_point):
+                series[key] = (LatestValueCache._copy(item), confirmed_at)
+            else:
+                series[key] = (entry[0], confirmed_at)
+            misses = self._misses.get(measurement_name)
+            if misses:
+                for miss_key in [k for k in misses if set(k).issubset(key)]:
+                    del misses[miss_key]
+
+    def add_miss(self, measurement_name: str, tags: Dict[str, Any], confirmed_at: Optional[float] = None):
+        """
+        Remembers that no series of measurement matches tags, until a matching point is saved or max_age passes.
+        """
+        confirmed_at = confirmed_at if confirmed_at is not None else time.monotonic()
+        with self._lock:
+            self._misses.setdefault(measurement_name, {})[LatestValueCache.get_series_key(tags)] = confirmed_at
+
+    def is_miss(self, measurement_name: str, tags: Dict[str, Any], max_age: Optional[float] = None) -> bool:
+        confirmed_at = self._misses.get(measurement_name, {}).get(LatestValueCache.get_series_key(tags))
+        if confirmed_at is None:
+            return False
+        max_age = max_age if max_age is not None else self.max_age
+        return max_age is None or time.monotonic() - confirmed_at <= max_age
+
+    def get(self, measurement_name: str, tags: Dict[str, Any], max_age: Optional[float] = None) -> Optional[Measurement]:
+        """
+        Latest point of series matching the given tags, or None if there is none or it is older than max_age seconds.
+        If tags do not name a single series, the latest point of all matching series is returned.
+        """
+        series = self._entries.get(measurement_name)
+        if series is None:
+            return None
+        max_age = max_age if max_age is not None else self.max_age
+        key = LatestValueCache.get_series_key(tags)
+        entry = series.get(key)
+        if entry is None:
+            matching = [e for k, e in list(series.items()) if set(key).issubset(k)]
+            if len(matching) == 0:
+                return None
+            entry = max(matching, key=lambda e: to_utc(e[0].time_point))
+        item, confirmed_at = entry
+        if max_age is not None and time.monotonic() - confirmed_at > max_age:
+            return None
+        return LatestValueCache._copy(item)
+
+    def get_all(self, measurement_name: str) -> List[Measurement]:
+        return [LatestValueCache._copy(item) for item, _ in list(self._entries.get(measurement_name, {}).values())]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._misses.clear()
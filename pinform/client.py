@@ -1,16 +1,24 @@
-from influxdb import InfluxDBClient
-from . import Measurement, MeasurementUtils
-from typing import List, Type, Optional, Dict, Union, Tuple, TypeVar, Generic
+from . import Measurement, MeasurementUtils, MeasurementNameComponent
+from .fields import MultipleChoiceStringField, EnumStringField, EnumIntegerField
+from .utils import ValueInterner, JsonCheckpoint, ChunkPipeline, to_utc
+from .cache import LatestValueCache
+from typing import List, Type, Optional, Dict, Union, Tuple, TypeVar, Generic, Callable, Any, Iterable, Iterator, TYPE_CHECKING
+import heapq
 import logging
 import pytz
-from pandas import DataFrame, Series
 import datetime
-import rfc3339
-import dateutil
-import traceback
 from enum import Enum
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+if TYPE_CHECKING:
+    from influxdb.resultset import ResultSet
+    from pandas import DataFrame, Series
+    from .spill import SpilledMeasurements
+    from .planner import QueryPlanner, QueryPlan, PlannedChunk
 
 logger = logging.getLogger('pinform')
 T = TypeVar('T', bound=Measurement)
@@ -152,42 +160,359 @@ class AggregationWindowIndex(Enum):
         return int(group_by_time_str[0:len(group_by_time_str) - 1]), AggregationTimeUnit.from_str(unit)
 
 
+def interval_to_timedelta(interval: str) -> datetime.timedelta:
+    """
+    Duration of an interval string like group by time intervals, e.g. 30m, 6h, 1d.
+    """
+    value, unit = AggregationWindowIndex.get_value_and_unit(interval)
+    if unit == AggregationTimeUnit.DAY:
+        return datetime.timedelta(days=value)
+    elif unit == AggregationTimeUnit.HOUR:
+        return datetime.timedelta(hours=value)
+    elif unit == AggregationTimeUnit.MINUTE:
+        return datetime.timedelta(minutes=value)
+    else:
+        return datetime.timedelta(seconds=value)
+
+
+def split_time_range(time_range: Tuple[datetime.datetime, datetime.datetime],
+                     chunk_interval: datetime.timedelta) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Splits a time range into consecutive half-open [start, end) sub-ranges of at most chunk_interval.
+    """
+    if time_range is None or time_range[0] is None or time_range[1] is None:
+        raise Exception('Time range with both start and end needed to split it into chunks')
+    if chunk_interval <= datetime.timedelta(0):
+        raise Exception('Chunk interval must be positive but found ' + str(chunk_interval))
+    chunks = []
+    chunk_start = time_range[0]
+    while chunk_start < time_range[1]:
+        chunk_end = min(chunk_start + chunk_interval, time_range[1])
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
 def parse_influx_str_time(time_str: str, tz: pytz.UTC = pytz.utc) -> datetime.datetime:
+    if len(time_str) > 20:
+        # fractional seconds, up to nanoseconds, are truncated to microseconds
+        seconds_part, fraction = time_str[:-1].split('.')
+        return tz.localize(datetime.datetime.strptime(seconds_part, '%Y-%m-%dT%H:%M:%S').replace(microsecond=int(fraction[:6].ljust(6, '0'))))
     return tz.localize(datetime.datetime.strptime(time_str, '%Y-%m-%dT%H:%M:%SZ'))
     # return dateutil.parser.parse(time_str).astimezone(tz)
 
 
+class SaveMode(Enum):
+    OVERWRITE = 'overwrite'
+    # only write points newer than the last stored point of their series
+    APPEND_NEW = 'append_new'
+    # skip points identical to a stored point within a recent time window
+    SKIP_UNCHANGED = 'skip_unchanged'
+
+
+class AlignMode(Enum):
+    # latest point at or before the time point, not older than tolerance
+    ASOF = 'asof'
+    # point at the same time point
+    EXACT = 'exact'
+
+
+class MemoryLimitMode(Enum):
+    # spill decoded points to memory-mapped temp files once they exceed the budget
+    SPILL = 'spill'
+    # raise before loading if the estimated size exceeds the budget
+    RAISE = 'raise'
+
+
+class PendingQuery(Generic[T]):
+    """
+    Result of a query issued inside InfluxClient.batch(), available with result() once the batch is executed.
+    """
+
+    def __init__(self, query_string: str, decoder: Callable[['ResultSet'], Any]):
+        self.query_string = query_string
+        self.decoder = decoder
+        self._done = False
+        self._result = None
+
+    def set_result_set(self, result_set: 'ResultSet'):
+        self._result = self.decoder(result_set)
+        self._done = True
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> Any:
+        if not self._done:
+            raise Exception('Query result is not available before the batch is executed: ' + self.query_string)
+        return self._result
+
+
+class QueryBatch:
+    """
+    Collects queries of load_points, load_points_as_dataframe, get_fields_as_series and
+    get_distinct_existing_tag_values and sends them as one multi-statement request.
+    """
+
+    def __init__(self, client: 'InfluxClient'):
+        self.client = client
+        self.pending_queries = []  # type: List[PendingQuery]
+
+    def add(self, query_string: str, decoder: Callable[['ResultSet'], Any]) -> PendingQuery:
+        pending_query = PendingQuery(query_string, decoder)
+        self.pending_queries.append(pending_query)
+        return pending_query
+
+    def execute(self) -> List[Any]:
+        pending_queries = self.pending_queries
+        self.pending_queries = []
+        if len(pending_queries) == 0:
+            return []
+        query_string = '; '.join(q.query_string.strip().rstrip(';') for q in pending_queries)
+        result = self.client.db_client.query(query_string)
+        result_sets = result if isinstance(result, list) else [result]
+        if len(result_sets) != len(pending_queries):
+            raise Exception('Expected ' + str(len(pending_queries)) + ' statement results in batch but got ' + str(len(result_sets)))
+        for pending_query, result_set in zip(pending_queries, result_sets):
+            pending_query.set_result_set(result_set)
+        return [q.result() for q in pending_queries]
+
+    def __enter__(self) -> 'QueryBatch':
+        # noinspection PyProtectedMember
+        self._outer_batch = getattr(self.client._local, 'batch', None)
+        # noinspection PyProtectedMember
+        self.client._local.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # noinspection PyProtectedMember
+        self.client._local.batch = self._outer_batch
+        if exc_type is None:
+            self.execute()
+
+
 class InfluxClient:
 
-    def __init__(self, host: str = "localhost", port: int = 8086, username: str = None, password: str = None, database_name: str = 'default'):
+    def __init__(self, host: str = "localhost", port: int = 8086, username: str = None, password: str = None, database_name: str = 'default',
+                 intern_cache_size: Optional[int] = 100000, latest_cache_max_age: Optional[float] = 60.0):
         self.database_name = database_name
-
+        # shared instances of tag and option values decoded by load_points, None disables interning
+        self.interner = ValueInterner(max_size=intern_cache_size) if intern_cache_size is not None else None
+        self._local = threading.local()
+        # latest point per series for get_latest, refreshed from database once older than latest_cache_max_age seconds
+        self.latest_cache = LatestValueCache(max_age=latest_cache_max_age)
+        self._planner = None
+
+        # the influxdb package imports pandas if available, so it is only imported once a client is created
+        from influxdb import InfluxDBClient
         self.db_client = InfluxDBClient(database=self.database_name, host=host, port=port, username=username, password=password)
         try:
             self.db_client.create_database(dbname=self.database_name)
         except:
-            logger.debug(traceback.format_exc())
+            logger.debug('Could not create database ' + str(self.database_name), exc_info=True)
 
     def close(self):
         self.db_client.close()
 
-    def save_points(self, items: List[T]) -> bool:
+    @property
+    def planner(self) -> 'QueryPlanner':
+        """
+        Query planner used by planned loads, created on first use.
+        """
+        if self._planner is None:
+            from .planner import QueryPlanner
+            self._planner = QueryPlanner(self)
+        return self._planner
+
+    def _run_plan(self, plan: 'QueryPlan', build_query: Callable[['PlannedChunk'], str],
+                  decode: Callable[['ResultSet'], Any]) -> List[Any]:
+        """
+        Queries the chunks of a plan with its concurrency and returns decoded results in chunk order.
+        """
+        def run_chunk(chunk: 'PlannedChunk') -> Any:
+            return decode(self.db_client.query(build_query(chunk)))
+
+        if plan.concurrency <= 1 or len(plan.chunks) == 1:
+            return [run_chunk(chunk) for chunk in plan.chunks]
+        with ThreadPoolExecutor(max_workers=plan.concurrency) as executor:
+            return list(executor.map(run_chunk, plan.chunks))
+
+    def batch(self) -> QueryBatch:
+        """
+        Inside the returned context, load_points, load_points_as_dataframe, get_fields_as_series and
+        get_distinct_existing_tag_values return PendingQuery objects instead of results. All queries are sent as one
+        multi-statement request when the context exits, after which each PendingQuery.result() returns what the
+        originating call would have returned.
+
+            with cli.batch():
+                aapl = cli.load_points(OHLC, tags={'symbol': 'AAPL'})
+                symbols = cli.get_distinct_existing_tag_values('symbol', measurement=OHLC)
+            aapl_points = aapl.result()
+
+        Planned loads and loads with max_memory send several queries that depend on each other, so they raise
+        inside the context.
+        """
+        return QueryBatch(self)
+
+    def execute_many(self, calls: List[Callable[[], PendingQuery]]) -> List[Any]:
+        """
+        Runs the given query calls in one multi-statement request and returns their results in order.
+
+            points, series = cli.execute_many([lambda: cli.load_points(OHLC), lambda: cli.get_fields_as_series(...)])
+        """
+        with self.batch() as query_batch:
+            for call in calls:
+                call()
+            return query_batch.execute()
+
+    def _query(self, query_string: str, decoder: Callable[['ResultSet'], Any]) -> Any:
+        query_batch = getattr(self._local, 'batch', None)
+        if query_batch is not None:
+            return query_batch.add(query_string, decoder)
+        return decoder(self.db_client.query(query_string))
+
+    def _check_not_batched(self, option: str):
+        if getattr(self._local, 'batch', None) is not None:
+            raise Exception('Loads with ' + option + ' run several queries and cannot be used inside batch()')
+
+    def _use_plan(self, planned: bool, time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]],
+                  limit: Optional[int]) -> bool:
+        # sub-ranges need both ends of the time range, other loads fall back to one query
+        if not planned or not isinstance(time_range, tuple) or time_range[0] is None or time_range[1] is None \
+                or limit is not None:
+            return False
+        self._check_not_batched('planned')
+        return True
+
+    def save_points(self, items: List[T], mode: Union[SaveMode, str] = SaveMode.OVERWRITE,
+                    hash_window: Optional[datetime.timedelta] = None, retention_policy: Optional[str] = None) -> bool:
+        """
+        Writes items to database.
+
+        :param items: measurement instances
+        :param mode: SaveMode.OVERWRITE writes every item. SaveMode.APPEND_NEW ('append_new') queries the last stored
+            time of each series and only writes newer items. SaveMode.SKIP_UNCHANGED ('skip_unchanged') skips items
+            identical to a stored point not older than hash_window before the newest item.
+        :param hash_window: time window checked for unchanged points in SKIP_UNCHANGED mode
+        :param retention_policy: retention policy to write to, default retention policy of database if None
+        :return: True if write succeeded
+        """
+        mode = SaveMode(mode)
+        if mode == SaveMode.APPEND_NEW:
+            items = self._filter_new_points(items)
+        elif mode == SaveMode.SKIP_UNCHANGED:
+            if hash_window is None:
+                raise Exception('Hash window needed for skip unchanged save mode')
+            items = self._filter_unchanged_points(items, hash_window)
+        if len(items) == 0:
+            return True
+
         items_list = []
         for item in items:
             items_list.append(item.get_cli_format())
-        return self.db_client.write_points(items_list)
-
-    def save_dataframe(self, df: DataFrame, measurement_type: Type[T]) -> bool:
+        result = self.db_client.write_points(items_list, retention_policy=retention_policy)
+        # only the newest item of each tracked series is copied into the cache
+        newest = {}  # type: Dict[Tuple[str, tuple], Measurement]
+        for item, cli_format in zip(items, items_list):
+            measurement_name = cli_format['measurement']
+            if self.latest_cache.is_tracked(measurement_name):
+                key = (measurement_name, LatestValueCache.get_series_key(item.get_tag_values_as_dict()))
+                current = newest.get(key)
+                if current is None or to_utc(item.time_point) >= to_utc(current.time_point):
+                    newest[key] = item
+        for (measurement_name, _), item in newest.items():
+            self.latest_cache.update(item, measurement_name=measurement_name)
+        return result
+
+    def save_lines(self, lines: Union[str, List[str]]) -> bool:
+        return self.db_client.write_points(lines, protocol='line')
+
+    def save_dataframe(self, df: 'DataFrame', measurement_type: Type[T], mode: Union[SaveMode, str] = SaveMode.OVERWRITE,
+                       hash_window: Optional[datetime.timedelta] = None, retention_policy: Optional[str] = None) -> bool:
         points = MeasurementUtils.from_dataframe(df, measurement_type)
-        return self.save_points(points)
+        return self.save_points(points, mode=mode, hash_window=hash_window, retention_policy=retention_policy)
 
-    def load_points(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
-                    tags: Optional[Dict[str, str]] = None,
-                    time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
-                    limit: Optional[int] = None, tz: pytz.UTC = pytz.utc) -> List[T]:
-        # noinspection SqlNoDataSourceInspection
-        query_string = "SELECT * FROM {measurement_name}".format(measurement_name=Measurement.get_name(measurement_type, name_components=name_components))
+    @staticmethod
+    def _group_by_measurement(items: List[T]) -> Dict[Tuple[type, str], List[T]]:
+        groups = {}
+        for item in items:
+            groups.setdefault((type(item), item.get_measurement_name()), []).append(item)
+        return groups
+
+    @staticmethod
+    def _get_series_key(tag_names: List[str], tags: Dict[str, Any]) -> Tuple[str, ...]:
+        # influxdb reports a missing tag as empty string in GROUP BY results
+        return tuple('' if tags.get(t_name) is None else str(tags[t_name]) for t_name in tag_names)
+
+    def _filter_new_points(self, items: List[T]) -> List[T]:
+        import rfc3339
+        pending = []
+        with self.batch():
+            for (measurement_type, measurement_name), group_items in InfluxClient._group_by_measurement(items).items():
+                fields = Measurement.get_fields(measurement_type)
+                tag_names = Measurement.get_tag_names(measurement_type)
+                # LAST ignores null values, so prefer a non-nullable field to find the time of the last point
+                non_null_fields = [f_name for f_name, f in fields.items() if not f.null]
+                last_field = non_null_fields[0] if len(non_null_fields) > 0 else list(fields.keys())[0]
+                since = min(to_utc(item.time_point) for item in group_items)
+                # noinspection SqlNoDataSourceInspection
+                query_string = """SELECT LAST("{field}") FROM {measurement_name} WHERE time >= '{since_dt}'""".format(
+                    field=last_field, measurement_name=measurement_name, since_dt=rfc3339.format(since, use_system_timezone=False))
+                if len(tag_names) > 0:
+                    query_string += " GROUP BY " + ", ".join('"' + t_name + '"' for t_name in tag_names)
+                pending.append((tag_names, group_items, self._query(query_string, lambda result_set: result_set)))
+
+        new_items = []
+        for tag_names, group_items, pending_query in pending:
+            last_times = {}
+            for (_, series_tags), series_points in pending_query.result().items():
+                for point in series_points:
+                    last_times[InfluxClient._get_series_key(tag_names, series_tags or {})] = parse_influx_str_time(point['time'])
+            for item in group_items:
+                last_time = last_times.get(InfluxClient._get_series_key(tag_names, item.get_tag_values_as_dict()))
+                if last_time is None or to_utc(item.time_point) > last_time:
+                    new_items.append(item)
+        return new_items
+
+    @staticmethod
+    def _get_content_key(time_point: datetime.datetime, tags: Tuple[str, ...], field_values: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        # whole values are compared, a hash alone could let a changed point collide with a stored one
+        return to_utc(time_point), tags, field_values
+
+    def _filter_unchanged_points(self, items: List[T], hash_window: datetime.timedelta) -> List[T]:
+        import rfc3339
+        pending = []
+        with self.batch():
+            for (measurement_type, measurement_name), group_items in InfluxClient._group_by_measurement(items).items():
+                since = max(to_utc(item.time_point) for item in group_items) - hash_window
+                # noinspection SqlNoDataSourceInspection
+                query_string = """SELECT * FROM {measurement_name} WHERE time >= '{since_dt}'""".format(
+                    measurement_name=measurement_name, since_dt=rfc3339.format(since, use_system_timezone=False))
+                pending.append((measurement_type, group_items, self._query(query_string, lambda result_set: result_set)))
+
+        changed_items = []
+        for measurement_type, group_items, pending_query in pending:
+            field_names = Measurement.get_field_names(measurement_type)
+            tag_names = Measurement.get_tag_names(measurement_type)
+            stored_keys = set()
+            for point in pending_query.result().get_points():
+                stored_keys.add(InfluxClient._get_content_key(
+                    parse_influx_str_time(point['time']), InfluxClient._get_series_key(tag_names, point),
+                    tuple(point.get(f_name) for f_name in field_names)))
+            for item in group_items:
+                cli_format = item.get_cli_format()
+                content_key = InfluxClient._get_content_key(
+                    item.time_point, InfluxClient._get_series_key(tag_names, cli_format['tags']),
+                    tuple(cli_format['fields'].get(f_name) for f_name in field_names))
+                if content_key not in stored_keys:
+                    changed_items.append(item)
+        return changed_items
 
+    @staticmethod
+    def _build_conditions(tags: Optional[Dict[str, str]] = None,
+                          time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                          end_exclusive: bool = False) -> List[str]:
+        import rfc3339
         and_conditions_list = []
         if tags is not None:
             for tag_name, tag_value in tags.items():
@@ -199,28 +524,41 @@ class InfluxClient:
                     """time >= '{day_start}' and time < '{nex_day_start}'""".format(
                         day_start=rfc3339.format(time_range, use_system_timezone=False),
                         nex_day_start=rfc3339.format(time_range + datetime.timedelta(days=1), use_system_timezone=False)))
+            elif end_exclusive:
+                # half-open ranges are used for consecutive chunks, so their bounds keep microseconds
+                if time_range[0] is not None:
+                    and_conditions_list.append("""time >= '{since_dt}'""".format(since_dt=rfc3339.format_microsecond(time_range[0], use_system_timezone=False)))
+                if time_range[1] is not None:
+                    and_conditions_list.append("""time < '{until_dt}'""".format(until_dt=rfc3339.format_microsecond(time_range[1], use_system_timezone=False)))
             else:
                 if time_range[0] is not None:
                     and_conditions_list.append("""time >= '{since_dt}'""".format(since_dt=rfc3339.format(time_range[0], use_system_timezone=False)))
                 if time_range[1] is not None:
                     and_conditions_list.append("""time <= '{until_dt}'""".format(until_dt=rfc3339.format(time_range[1], use_system_timezone=False)))
+        return and_conditions_list
 
+    def _build_load_points_query(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                                 tags: Optional[Dict[str, str]] = None,
+                                 time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                                 limit: Optional[int] = None, end_exclusive: bool = False) -> str:
+        # noinspection SqlNoDataSourceInspection
+        query_string = "SELECT * FROM {measurement_name}".format(measurement_name=Measurement.get_name(measurement_type, name_components=name_components))
+
+        and_conditions_list = InfluxClient._build_conditions(tags=tags, time_range=time_range, end_exclusive=end_exclusive)
         if len(and_conditions_list) > 0:
             query_string += " WHERE " + (" AND ".join(and_conditions_list))
 
         if limit is not None:
             query_string += " LIMIT {limit}".format(limit=limit)
         query_string += ';'
+        return query_string
 
+    def _decode_points(self, points: Iterable[Dict[str, Any]], measurement_type: Type[T], tz: pytz.UTC = pytz.utc,
+                       intern_values: bool = True, decode_enums: bool = False,
+                       name_components: Optional[Dict[str, str]] = None) -> List[T]:
         measurement_tags = Measurement.get_tags(cls=measurement_type)
         measurement_fields = Measurement.get_fields(cls=measurement_type)
 
-        ts1 = time.monotonic()
-        result = [p for p in self.db_client.query(query_string).get_points()]
-        ts2 = time.monotonic()
-
-        # printx('query results in ' + str(ts2-ts1) + ' seconds')
-
         measurements_list = []
         field_names = []
         tag_names = []
@@ -230,79 +568,364 @@ class InfluxClient:
         for tag_name, t in measurement_tags.items():
             tag_names.append(tag_name)
 
-        # printx('field names ' + str(field_names))
-        # printx('tag names ' + str(tag_names))
-
-        total_field_finding = 0
-        total_creation = 0
-        total_appending = 0
-        total_parsing = 0
-        ts3 = time.monotonic()
-        for item in result:
-            t5 = time.monotonic()
-            data_points = {**{f: item[f] for f in field_names}, **{t: item[t] for t in tag_names}, 'time_point': parse_influx_str_time(item.get('time'), tz)}
-            # for f_name in field_names:
-            #     data_points[f_name] = item[f_name]
-            # for t_name in tag_names:
-            #     data_points[t_name] = item[t_name]
-            # printx(item.get('time'))
-            # t11 = time.monotonic()
-            # dt = parse_influx_str_time(item.get('time'), tz)
-            # t12 = time.monotonic()
-            # total_parsing += t12 - t11
-            # data_points['time_point'] = dt
-            # data_points['time_point'] = parse_influx_str_time(item.get('time'), tz)
+        interned_names = []
+        if intern_values and self.interner is not None:
+            interned_names = tag_names + [f_name for f_name, f in measurement_fields.items() if isinstance(f, (MultipleChoiceStringField, EnumStringField))]
+        intern = self.interner.intern if self.interner is not None else None
+        enum_members = {}
+        if decode_enums:
+            for f_name, f in measurement_fields.items():
+                if isinstance(f, (EnumStringField, EnumIntegerField)):
+                    enum_members[f_name] = {e.value: e for e in f.enum}
+        # name components of the queried measurement name are set on loaded items, so they resolve to the same name
+        component_values = {}
+        if name_components is not None:
+            component_names = [n for n, v in measurement_type.__dict__.items() if isinstance(v, MeasurementNameComponent)]
+            component_values = {n: v for n, v in name_components.items() if n in component_names}
+
+        for item in points:
+            # a tag or field never written is missing from results instead of being null
+            data_points = {**{f: item.get(f) for f in field_names}, **{t: item.get(t) for t in tag_names}, 'time_point': parse_influx_str_time(item.get('time'), tz)}
+            if component_values:
+                data_points.update(component_values)
+            for i_name in interned_names:
+                data_points[i_name] = intern(data_points[i_name])
+            for e_name, members in enum_members.items():
+                if data_points[e_name] is not None:
+                    data_points[e_name] = members[data_points[e_name]]
             # noinspection PyCallingNonCallable
-            t6 = time.monotonic()
-            total_field_finding += t6-t5
-
-            t7 = time.monotonic()
-            iitem = measurement_type(**data_points)
-            t8 = time.monotonic()
-            total_creation += t8 - t7
-
-            t9 = time.monotonic()
-            measurements_list.append(
-                iitem
-            )
-            t10 = time.monotonic()
-            total_appending += t10-t9
-        ts4 = time.monotonic()
-
-        # printx('create list in ' + str(ts4 - ts3) + ' seconds')
-        # printx('total_field_finding  ' + str(total_field_finding) + ' seconds')
-        # printx('total_creation  ' + str(total_creation) + ' seconds')
-        # printx('total_appending  ' + str(total_appending) + ' seconds')
-        # printx('total_parsing  ' + str(total_parsing) + ' seconds')
+            measurements_list.append(measurement_type(**data_points))
 
         return measurements_list
 
-    def load_points_as_dataframe(self, measurement: Type[T], tags: Optional[Dict[str, str]] = None,
-                                 time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
-                                 limit: Optional[int] = None, tz: datetime.tzinfo = pytz.utc) -> DataFrame:
-        return MeasurementUtils.to_dataframe(self.load_points(measurement, tags, time_range, limit, tz))
+    def _count_points(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                      tags: Optional[Dict[str, str]] = None,
+                      time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                      limit: Optional[int] = None) -> int:
+        # noinspection SqlNoDataSourceInspection
+        query_string = "SELECT COUNT(*) FROM {measurement_name}".format(measurement_name=Measurement.get_name(measurement_type, name_components=name_components))
+        and_conditions_list = InfluxClient._build_conditions(tags=tags, time_range=time_range)
+        if len(and_conditions_list) > 0:
+            query_string += " WHERE " + (" AND ".join(and_conditions_list))
+        query_string += ';'
+        count = 0
+        for point in self.db_client.query(query_string).get_points():
+            # every point has at least one field, so the largest field count is the point count
+            count = max([count] + [v for k, v in point.items() if k.startswith('count_') and v is not None])
+        return count if limit is None else min(count, limit)
+
+    def _load_points_bounded(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]],
+                             tags: Optional[Dict[str, str]],
+                             time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]],
+                             limit: Optional[int], tz: pytz.UTC, intern_values: bool, decode_enums: bool,
+                             max_memory: int, memory_limit_mode: Union[MemoryLimitMode, str],
+                             spill_directory: Optional[str]) -> Union[List[T], 'SpilledMeasurements']:
+        from .columnar import estimate_row_size
+        from .spill import SpillWriter
+        self._check_not_batched('max_memory')
+        memory_limit_mode = MemoryLimitMode(memory_limit_mode)
+        row_size = estimate_row_size(measurement_type)
+        estimated_size = row_size * self._count_points(measurement_type, name_components=name_components, tags=tags,
+                                                       time_range=time_range, limit=limit)
+        if estimated_size > max_memory and memory_limit_mode == MemoryLimitMode.RAISE:
+            raise Exception('Loading ' + measurement_type.__name__ + ' needs about ' + str(estimated_size) +
+                            ' bytes, more than max memory of ' + str(max_memory) + ' bytes')
+
+        query_string = self._build_load_points_query(measurement_type, name_components=name_components, tags=tags,
+                                                     time_range=time_range, limit=limit)
+        # a decoded chunk and the points kept in memory both fit in the budget
+        chunk_size = max(1, min(50000, max_memory // (4 * row_size)))
+        items = []
+        writer = None
+        if estimated_size > max_memory:
+            writer = SpillWriter(measurement_type, directory=spill_directory, tz=tz)
+        try:
+            for result_set in self.db_client.query(query_string, chunked=True, chunk_size=chunk_size):
+                chunk = self._decode_points(result_set.get_points(), measurement_type, tz=tz, intern_values=intern_values,
+                                            decode_enums=decode_enums, name_components=name_components)
+                if writer is None and (len(items) + len(chunk)) * row_size > max_memory:
+                    logger.info('loaded points of ' + measurement_type.__name__ + ' exceed max memory, spilling to disk')
+                    writer = SpillWriter(measurement_type, directory=spill_directory, tz=tz)
+                    writer.append(items)
+                    items = []
+                if writer is not None:
+                    writer.append(chunk)
+                else:
+                    items.extend(chunk)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        return items if writer is None else writer.finish()
 
-    def get_fields_as_series(self, measurement: Type[T],
-                             field_aggregations: Dict[str, Optional[List[AggregationMode]]],
-                             name_components: Optional[Dict[str, str]] = None,
-                             tags: Optional[Dict[str, str]] = None, group_by_time_interval: Optional[str] = None,
-                             fill_mode: Optional[FillMode] = None, fill_number: Optional[int] = None,
-                             window_index_location: AggregationWindowIndex = AggregationWindowIndex.START,
-                             time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
-                             limit: Optional[int] = None, tz: pytz.UTC = pytz.utc) -> Dict[str, Series]:
-        if field_aggregations is None or len(field_aggregations.items()) == 0:
-            raise Exception('Null or invalid field aggregations')
+    @staticmethod
+    def _decode_point_columns(points: Iterable[Dict[str, Any]], measurement_type: Type[T],
+                              tz: pytz.UTC = pytz.utc) -> Tuple[List[datetime.datetime], Dict[str, List[Any]]]:
+        """
+        Time points and lists of values by field and tag name of query result points, without measurement instances.
+        """
+        names = list(Measurement.get_fields(measurement_type).keys()) + list(Measurement.get_tags(measurement_type).keys())
+        time_points = []
+        values = {name: [] for name in names}
+        for point in points:
+            time_points.append(parse_influx_str_time(point['time'], tz))
+            for name in names:
+                values[name].append(point.get(name))
+        return time_points, values
 
+    def load_points(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                    tags: Optional[Dict[str, str]] = None,
+                    time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                    limit: Optional[int] = None, tz: pytz.UTC = pytz.utc,
+                    intern_values: bool = True, decode_enums: bool = False, max_memory: Optional[int] = None,
+                    memory_limit_mode: Union[MemoryLimitMode, str] = MemoryLimitMode.SPILL,
+                    spill_directory: Optional[str] = None, planned: bool = False) -> Union[List[T], 'SpilledMeasurements']:
+        """
+        Loads points of a measurement.
+
+        :param max_memory: memory budget in bytes for decoded points. With a budget, points are counted first and
+            loaded in chunks outside of query batches.
+        :param memory_limit_mode: MemoryLimitMode.SPILL ('spill') moves points to memory-mapped temp files once they
+            exceed max_memory and returns a read-only SpilledMeasurements sequence instead of a list.
+            MemoryLimitMode.RAISE ('raise') raises before loading if the counted points would exceed max_memory.
+        :param spill_directory: directory of spill temp files, system temp directory if None
+        :param planned: split time range into sub-ranges queried concurrently as chosen by planner, only used with a
+            (start, end) time range with both ends set and without limit or max_memory
+        """
+        if max_memory is not None:
+            return self._load_points_bounded(measurement_type, name_components, tags, time_range, limit, tz,
+                                             intern_values, decode_enums, max_memory, memory_limit_mode, spill_directory)
+        if self._use_plan(planned, time_range, limit):
+            plan = self.planner.plan_load_points(measurement_type, time_range, name_components=name_components, tags=tags)
+            results = self._run_plan(plan, lambda chunk: self._build_load_points_query(
+                measurement_type, name_components=name_components, tags=tags, time_range=(chunk.start, chunk.end),
+                end_exclusive=not chunk.last), lambda result_set: self._decode_points(
+                result_set.get_points(), measurement_type, tz=tz, intern_values=intern_values, decode_enums=decode_enums,
+                name_components=name_components))
+            return [item for items in results for item in items]
+        query_string = self._build_load_points_query(measurement_type, name_components=name_components, tags=tags,
+                                                     time_range=time_range, limit=limit)
+        return self._query(query_string, lambda result_set: self._decode_points(
+            result_set.get_points(), measurement_type, tz=tz, intern_values=intern_values, decode_enums=decode_enums,
+            name_components=name_components))
 
-        if fill_mode is not None and fill_mode == FillMode.NUMBER:
-            assert fill_number is not None, 'Null fill number passed with number fill mode'
-        else:
-            assert fill_number is None, 'Fill number passed with non-number fill mode'
+    def load_points_as_dataframe(self, measurement: Type[T], tags: Optional[Dict[str, str]] = None,
+                                 time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                                 limit: Optional[int] = None, tz: datetime.tzinfo = pytz.utc,
+                                 name_components: Optional[Dict[str, str]] = None, max_memory: Optional[int] = None,
+                                 memory_limit_mode: Union[MemoryLimitMode, str] = MemoryLimitMode.SPILL,
+                                 spill_directory: Optional[str] = None, planned: bool = False) -> 'DataFrame':
+        """
+        Loads points of a measurement as a DataFrame. With max_memory, see load_points, a spilled result gives a
+        DataFrame whose numeric and category code columns are memory-mapped. With planned, see load_points, large
+        results are decoded straight into columns without measurement instances and their per point validation.
+        """
+        if max_memory is not None:
+            items = self._load_points_bounded(measurement, name_components, tags, time_range, limit, tz, True, False,
+                                              max_memory, memory_limit_mode, spill_directory)
+            if isinstance(items, list):
+                return MeasurementUtils.to_dataframe(items)
+            df = items.to_dataframe()
+            if tz is not None and tz != pytz.utc:
+                df.index = df.index.tz_convert(tz)
+            return df
+        if self._use_plan(planned, time_range, limit):
+            from .planner import DecodeMode
+            plan = self.planner.plan_load_points(measurement, time_range, name_components=name_components, tags=tags,
+                                                 as_dataframe=True)
+
+            def build_query(chunk: 'PlannedChunk') -> str:
+                return self._build_load_points_query(measurement, name_components=name_components, tags=tags,
+                                                     time_range=(chunk.start, chunk.end), end_exclusive=not chunk.last)
+            if plan.decode_mode == DecodeMode.OBJECT:
+                results = self._run_plan(plan, build_query, lambda result_set: self._decode_points(
+                    result_set.get_points(), measurement, tz=tz, name_components=name_components))
+                return MeasurementUtils.to_dataframe([item for items in results for item in items])
+            results = self._run_plan(plan, build_query, lambda result_set: self._decode_point_columns(
+                result_set.get_points(), measurement, tz=tz))
+            time_points = [t for chunk_times, _ in results for t in chunk_times]
+            if len(time_points) == 0:
+                return MeasurementUtils.to_dataframe([])
+            values = {name: [v for _, chunk_values in results for v in chunk_values[name]] for name in results[0][1].keys()}
+            return MeasurementUtils.columns_to_dataframe(measurement, time_points, values)
+        query_string = self._build_load_points_query(measurement, name_components=name_components, tags=tags,
+                                                     time_range=time_range, limit=limit)
+        return self._query(query_string, lambda result_set: MeasurementUtils.to_dataframe(
+            self._decode_points(result_set.get_points(), measurement, tz=tz, name_components=name_components)))
+
+    def load_aligned(self, measurement_types: List[Type[Measurement]],
+                     time_range: Tuple[datetime.datetime, datetime.datetime],
+                     tags: Optional[Dict[str, str]] = None, tolerance: Optional[datetime.timedelta] = None,
+                     mode: Union[AlignMode, str] = AlignMode.ASOF, by: Optional[List[str]] = None,
+                     name_components: Optional[Dict[str, str]] = None,
+                     chunk_interval: datetime.timedelta = datetime.timedelta(hours=1), concurrency: int = 4,
+                     tz: pytz.UTC = pytz.utc) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        Aligns points of other measurements to time points of the first one. Time range is read chunk by chunk with
+        all measurements of a chunk queried concurrently, and the time sorted results are merge-joined as they arrive,
+        so memory stays proportional to chunk_interval instead of time_range.
+
+        :param measurement_types: measurement classes, the first one gives the time points of the result
+        :param time_range: (start, end) of first measurement points, end exclusive
+        :param tags: tag filter, each measurement is filtered by the tags it has
+        :param tolerance: in ASOF mode, maximum age of a matched point, unlimited if None. Matched points earlier
+            than time range start are only found within tolerance.
+        :param mode: AlignMode.ASOF ('asof') matches the latest point at or before each time point,
+            AlignMode.EXACT ('exact') only a point at the same time point
+        :param by: tag names that must also be equal for points to match, e.g. ['symbol']
+        :param name_components: name components of dynamic measurement names, shared by all measurements
+        :param chunk_interval: time span of each read
+        :param concurrency: number of queries run in parallel
+        :param tz: time zone of time points
+        :return: generator of aligned batches, one per chunk with points, each a list of
+            (time_point, first measurement item, matched item of each other measurement or None) tuples
+        """
+        mode = AlignMode(mode)
+        if measurement_types is None or len(measurement_types) < 2:
+            raise Exception('At least two measurement types needed for alignment')
+        chunks = split_time_range(time_range, chunk_interval)
+        lookback = tolerance if mode == AlignMode.ASOF and tolerance is not None else datetime.timedelta(0)
+        by = by if by is not None else []
+        type_count = len(measurement_types)
+
+        def read_chunk(type_index: int, chunk_index: int) -> List[Measurement]:
+            measurement_type = measurement_types[type_index]
+            chunk = chunks[chunk_index]
+            if type_index > 0 and chunk_index == 0:
+                chunk = (chunk[0] - lookback, chunk[1])
+            type_tags = None
+            if tags is not None:
+                measurement_tags = Measurement.get_tags(measurement_type)
+                type_tags = {t_name: t_value for t_name, t_value in tags.items() if t_name in measurement_tags}
+            query_string = self._build_load_points_query(measurement_type, name_components=name_components, tags=type_tags,
+                                                         time_range=chunk, end_exclusive=True)
+            return self._decode_points(self.db_client.query(query_string).get_points(), measurement_type, tz=tz,
+                                       name_components=name_components)
+
+        # latest point of each other measurement per by key, kept across chunks
+        latest = [{} for _ in range(type_count)]  # type: List[Dict[Tuple[Any, ...], Measurement]]
+
+        def merge_chunk(chunk_items: List[List[Measurement]]) -> List[Tuple[Any, ...]]:
+            # other measurements sort before the first one at equal time, so a point matches itself in time
+            streams = [[(item.time_point, 0 if type_index > 0 else 1, type_index, item) for item in items]
+                       for type_index, items in enumerate(chunk_items)]
+            rows = []
+            for time_point, _, type_index, item in heapq.merge(*streams, key=lambda e: (e[0], e[1])):
+                # noinspection PyProtectedMember
+                key = tuple(item._data.get(b_name) for b_name in by)
+                if type_index > 0:
+                    latest[type_index][key] = item
+                    continue
+                row = [time_point, item]
+                for other_index in range(1, type_count):
+                    match = latest[other_index].get(key)
+                    if match is not None:
+                        if mode == AlignMode.EXACT:
+                            match = match if match.time_point == time_point else None
+                        elif tolerance is not None and time_point - match.time_point > tolerance:
+                            match = None
+                    row.append(match)
+                rows.append(tuple(row))
+            return rows
+
+        prefetch = max(1, -(-concurrency // type_count))
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = deque()
+            next_chunk = 0
+            while next_chunk < len(chunks) or len(pending) > 0:
+                while next_chunk < len(chunks) and len(pending) < prefetch:
+                    pending.append([pool.submit(read_chunk, type_index, next_chunk) for type_index in range(type_count)])
+                    next_chunk += 1
+                rows = merge_chunk([future.result() for future in pending.popleft()])
+                if len(rows) > 0:
+                    yield rows
+
+    def load_aligned_as_dataframe(self, measurement_types: List[Type[Measurement]],
+                                  time_range: Tuple[datetime.datetime, datetime.datetime],
+                                  tags: Optional[Dict[str, str]] = None, tolerance: Optional[datetime.timedelta] = None,
+                                  mode: Union[AlignMode, str] = AlignMode.ASOF, by: Optional[List[str]] = None,
+                                  name_components: Optional[Dict[str, str]] = None,
+                                  chunk_interval: datetime.timedelta = datetime.timedelta(hours=1), concurrency: int = 4,
+                                  tz: pytz.UTC = pytz.utc) -> 'DataFrame':
+        """
+        load_aligned result as one DataFrame indexed by time_point, with (measurement class name, column name) columns.
+        Each batch is converted as it arrives, so only the typed columns of the whole result are held, not its items.
+        """
+        import pandas
+        frames = [MeasurementUtils.aligned_to_dataframe(rows, measurement_types) for rows in self.load_aligned(
+            measurement_types, time_range=time_range, tags=tags, tolerance=tolerance, mode=mode, by=by,
+            name_components=name_components, chunk_interval=chunk_interval, concurrency=concurrency, tz=tz)]
+        if len(frames) == 0:
+            return pandas.DataFrame()
+        df = pandas.concat(frames)
+        for m_type in measurement_types:
+            column_names = MeasurementUtils.get_dataframe_column_names(m_type)
+            for t_name in Measurement.get_tags(m_type).keys():
+                # categories differ between batches, so concatenated tag columns are categorized again
+                df[(m_type.__name__, column_names[t_name])] = df[(m_type.__name__, column_names[t_name])].astype('category')
+        return df
+
+    def _load_latest(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                     tags: Optional[Dict[str, str]] = None, tz: pytz.UTC = pytz.utc) -> List[T]:
+        measurement_name = Measurement.get_name(measurement_type, name_components=name_components)
+        # noinspection SqlNoDataSourceInspection
+        query_string = "SELECT * FROM {measurement_name}".format(measurement_name=measurement_name)
+        and_conditions_list = InfluxClient._build_conditions(tags=tags)
+        if len(and_conditions_list) > 0:
+            query_string += " WHERE " + (" AND ".join(and_conditions_list))
+        query_string += " GROUP BY * ORDER BY time DESC LIMIT 1"
+
+        def decode(result_set: 'ResultSet') -> List[T]:
+            points = []
+            for (_, series_tags), series_points in result_set.items():
+                # tags of each series come with the series, with empty string for a missing tag
+                tag_values = {t_name: (t_value if t_value != '' else None) for t_name, t_value in (series_tags or {}).items()}
+                for point in series_points:
+                    point.update(tag_values)
+                    points.append(point)
+            return self._decode_points(points, measurement_type, tz=tz)
+
+        latest_items = decode(self.db_client.query(query_string))
+        confirmed_at = time.monotonic()
+        self.latest_cache.track(measurement_name)
+        for item in latest_items:
+            self.latest_cache.update(item, measurement_name=measurement_name, confirmed_at=confirmed_at)
+        return latest_items
+
+    def warm_latest(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None, tz: pytz.UTC = pytz.utc) -> int:
+        """
+        Loads the latest point of every series of a measurement into the latest value cache with one query. Points
+        of the measurement saved with save_points afterwards keep the cache current.
 
-        group_by_time_regex = re.compile('^[1-9][0-9]*[dhms]$')
-        assert group_by_time_interval is None or bool(group_by_time_regex.match(group_by_time_interval)), \
-            'Invalid group by time ' + str(group_by_time_interval) + ', needs to be a positive integer and either of [dhms]'
+        :return: number of cached series
+        """
+        return len(self._load_latest(measurement_type, name_components=name_components, tz=tz))
 
+    def get_latest(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                   tags: Optional[Dict[str, str]] = None, max_age: Optional[float] = None,
+                   tz: pytz.UTC = pytz.utc) -> Optional[T]:
+        """
+        Returns the latest point of the series with given tags from the latest value cache, e.g.
+        cli.get_latest(OHLC, tags={'symbol': 'AAPL'}). The series is queried again if it is not cached or was last
+        confirmed more than max_age seconds ago (latest_cache_max_age of client by default). A series without points
+        returns None and is not queried again until max_age passes or a matching point is saved.
+        """
+        tags = tags if tags is not None else {}
+        measurement_name = Measurement.get_name(measurement_type, name_components=name_components)
+        item = self.latest_cache.get(measurement_name, tags, max_age=max_age)
+        if item is not None or self.latest_cache.is_miss(measurement_name, tags, max_age=max_age):
+            return item
+        self._load_latest(measurement_type, name_components=name_components, tags=tags, tz=tz)
+        item = self.latest_cache.get(measurement_name, tags, max_age=None)
+        if item is None:
+            self.latest_cache.add_miss(measurement_name, tags)
+        return item
+
+    def _build_fields_query(self, measurement: Type[T], field_aggregations: Dict[str, Optional[List[AggregationMode]]],
+                            name_components: Optional[Dict[str, str]], tags: Optional[Dict[str, str]],
+                            group_by_time_interval: Optional[str], fill_mode: Optional[FillMode], fill_number: Optional[int],
+                            time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]],
+                            limit: Optional[int], end_exclusive: bool = False) -> Tuple[str, List[str]]:
         query_string = "SELECT "
 
         measurement_name = Measurement.get_name(measurement, name_components=name_components)
@@ -324,23 +947,7 @@ class InfluxClient:
         query_string += ', '.join(properties)
         query_string += " FROM {measurement_name}".format(measurement_name=measurement_name)
 
-        and_conditions_list = []
-        if tags is not None:
-            for tag_name, tag_value in tags.items():
-                and_conditions_list.append(""""{tag_name}"='{tag_value}'""".format(tag_name=tag_name, tag_value=tag_value))
-
-        if time_range is not None:
-            if isinstance(time_range, datetime.date):
-                and_conditions_list.append(
-                    """time >= '{day_start}' and time < '{nex_day_start}'""".format(
-                        day_start=rfc3339.format(time_range, use_system_timezone=False),
-                        nex_day_start=rfc3339.format(time_range + datetime.timedelta(days=1), use_system_timezone=False)))
-            else:
-                if time_range[0] is not None:
-                    and_conditions_list.append("""time >= '{since_dt}'""".format(since_dt=rfc3339.format(time_range[0], use_system_timezone=False)))
-                if time_range[1] is not None:
-                    and_conditions_list.append("""time <= '{until_dt}'""".format(until_dt=rfc3339.format(time_range[1], use_system_timezone=False)))
-
+        and_conditions_list = InfluxClient._build_conditions(tags=tags, time_range=time_range, end_exclusive=end_exclusive)
         if len(and_conditions_list) > 0:
             query_string += " WHERE " + (" AND ".join(and_conditions_list))
 
@@ -355,18 +962,64 @@ class InfluxClient:
                 query_string += " FILL(" + str(fill_number) + ")"
             else:
                 query_string += " FILL(" + fill_mode.get_str() + ")"
+        return query_string, aggregated_field_names
 
-        points = [p for p in self.db_client.query(query_string).get_points()]
-        if group_by_time_interval is not None:
-            times = [window_index_location.get_time_point_of_window(parse_influx_str_time(p.get('time'), tz), str(group_by_time_interval)) for p in points]
+    def get_fields_as_series(self, measurement: Type[T],
+                             field_aggregations: Dict[str, Optional[List[AggregationMode]]],
+                             name_components: Optional[Dict[str, str]] = None,
+                             tags: Optional[Dict[str, str]] = None, group_by_time_interval: Optional[str] = None,
+                             fill_mode: Optional[FillMode] = None, fill_number: Optional[int] = None,
+                             window_index_location: AggregationWindowIndex = AggregationWindowIndex.START,
+                             time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                             limit: Optional[int] = None, tz: pytz.UTC = pytz.utc, planned: bool = False) -> Dict[str, 'Series']:
+        """
+        With planned set, the time range is split at group by window bounds and queried concurrently as chosen by
+        planner. Queries with limit, with previous or linear fill or aggregating without group by time are not split,
+        since their results depend on points outside a sub-range.
+        """
+        if field_aggregations is None or len(field_aggregations.items()) == 0:
+            raise Exception('Null or invalid field aggregations')
+
+
+        if fill_mode is not None and fill_mode == FillMode.NUMBER:
+            assert fill_number is not None, 'Null fill number passed with number fill mode'
         else:
-            times = [parse_influx_str_time(p.get('time'), tz) for p in points]
+            assert fill_number is None, 'Fill number passed with non-number fill mode'
 
-        result_dict = {}
-        for aggregated_field_name in aggregated_field_names:
-            result_dict[aggregated_field_name] = Series(data=[p.get(aggregated_field_name) for p in points], index=times)
+        group_by_time_regex = re.compile('^[1-9][0-9]*[dhms]$')
+        assert group_by_time_interval is None or bool(group_by_time_regex.match(group_by_time_interval)), \
+            'Invalid group by time ' + str(group_by_time_interval) + ', needs to be a positive integer and either of [dhms]'
+
+        query_string, aggregated_field_names = self._build_fields_query(
+            measurement, field_aggregations, name_components, tags, group_by_time_interval, fill_mode, fill_number,
+            time_range, limit)
 
-        return result_dict
+        def decode(result_set: 'ResultSet') -> Dict[str, 'Series']:
+            from pandas import Series
+            points = [p for p in result_set.get_points()]
+            if group_by_time_interval is not None:
+                times = [window_index_location.get_time_point_of_window(parse_influx_str_time(p.get('time'), tz), str(group_by_time_interval)) for p in points]
+            else:
+                times = [parse_influx_str_time(p.get('time'), tz) for p in points]
+
+            result_dict = {}
+            for aggregated_field_name in aggregated_field_names:
+                result_dict[aggregated_field_name] = Series(data=[p.get(aggregated_field_name) for p in points], index=times)
+
+            return result_dict
+
+        # aggregations over the whole time range cannot be split
+        aggregated = any(modes for modes in field_aggregations.values()) and group_by_time_interval is None
+        if not aggregated and fill_mode not in (FillMode.PREVIOUS, FillMode.LINEAR) and \
+                self._use_plan(planned, time_range, limit):
+            import pandas
+            plan = self.planner.plan_fields_query(measurement, time_range, name_components=name_components, tags=tags,
+                                                  group_by_time_interval=group_by_time_interval)
+            results = self._run_plan(plan, lambda chunk: self._build_fields_query(
+                measurement, field_aggregations, name_components, tags, group_by_time_interval, fill_mode, fill_number,
+                (chunk.start, chunk.end), limit, end_exclusive=not chunk.last)[0], decode)
+            return {f_name: pandas.concat([r[f_name] for r in results]) for f_name in aggregated_field_names}
+        return self._query(query_string, decode)
 
     def get_distinct_existing_tag_values(self, tag_name: str, measurement: Optional[Type[T]] = None, name_components: Dict[str, str] = None):
         """
@@ -383,10 +1036,94 @@ class InfluxClient:
         query_string = "show tag values" + ("" if measurement is None else (" from " + Measurement.get_name(measurement, name_components=name_components))) \
                        + " " + ('with key = "{tag_name}"'.format(tag_name=tag_name))
 
-        result_set = self.db_client.query(query_string)
+        def decode(result_set: 'ResultSet') -> List[str]:
+            tag_values_set = set()
+            for item_dict in result_set.get_points():
+                tag_values_set.add(item_dict.get("value"))
+
+            return list(tag_values_set)
 
-        tag_values_set = set()
-        for item_dict in result_set.get_points():
-            tag_values_set.add(item_dict.get("value"))
+        return self._query(query_string, decode)
 
-        return list(tag_values_set)
+    def copy(self, measurement_type: Type[T], time_range: Tuple[datetime.datetime, datetime.datetime],
+             dst: Optional['InfluxClient'] = None, name_components: Optional[Dict[str, str]] = None,
+             dst_name_components: Optional[Dict[str, str]] = None, tags: Optional[Dict[str, str]] = None,
+             transform: Optional[Callable[[List[T]], List[T]]] = None,
+             chunk_interval: datetime.timedelta = datetime.timedelta(hours=1),
+             read_concurrency: int = 2, write_concurrency: int = 2, write_batch_size: int = 5000,
+             dst_retention_policy: Optional[str] = None, checkpoint_path: Optional[str] = None,
+             progress: Optional[Callable[[datetime.datetime, int], None]] = None) -> int:
+        """
+        Streams points of a measurement from this client's database to dst, chunk by chunk of time, so memory stays
+        bounded by (read_concurrency + write_concurrency) chunks however long time_range is.
+
+        :param measurement_type: measurement class
+        :param time_range: (start, end) of copied points, end exclusive
+        :param dst: destination client, this client if None (e.g. to rename a measurement or change retention policy)
+        :param name_components: name components of source measurement name
+        :param dst_name_components: name components set on points before writing, to rename dynamic measurement names
+        :param tags: optional tag filter of copied points
+        :param transform: optional function applied to each chunk of points, returning the points to write
+        :param chunk_interval: time span of each read
+        :param read_concurrency: number of chunks read in parallel
+        :param write_concurrency: number of write batches sent in parallel
+        :param write_batch_size: maximum points per write request
+        :param dst_retention_policy: retention policy to write to
+        :param checkpoint_path: json file keeping the time up to which all points are written, copy resumes from it. A
+            checkpoint of another measurement, tags, time range or chunk interval is discarded and copy starts over
+        :param progress: called with (time cursor, points written so far) after each completed chunk
+        :return: number of written points
+        """
+        dst = dst if dst is not None else self
+        chunks = split_time_range(time_range, chunk_interval)
+
+        def format_time(time_point: datetime.datetime) -> str:
+            return to_utc(time_point).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+        checkpoint = None
+        if checkpoint_path is not None:
+            # a cursor only means the same copied points for the same measurement, filter, time range and chunks
+            checkpoint = JsonCheckpoint(checkpoint_path, {
+                'measurement': Measurement.get_name(measurement_type, name_components=name_components),
+                'tags': tags,
+                'time_range': [format_time(time_range[0]), format_time(time_range[1])],
+                'chunk_interval': chunk_interval.total_seconds()})
+            if 'cursor' in checkpoint.state:
+                cursor = parse_influx_str_time(checkpoint.state['cursor'])
+                chunks = [c for c in chunks if to_utc(c[1]) > cursor]
+                logger.info('resuming copy of ' + measurement_type.__name__ + ' from ' + str(cursor))
+
+        def read_chunk(chunk: Tuple[datetime.datetime, datetime.datetime]) -> List[T]:
+            query_string = self._build_load_points_query(measurement_type, name_components=name_components, tags=tags,
+                                                         time_range=chunk, end_exclusive=True)
+            return self._decode_points(self.db_client.query(query_string).get_points(), measurement_type,
+                                       name_components=name_components)
+
+        def write_batch(batch: List[T]) -> bool:
+            return dst.save_points(batch, retention_policy=dst_retention_policy)
+
+        written = [0]
+
+        def write_chunk(_, items: List[T]):
+            if transform is not None:
+                items = transform(items)
+            if dst_name_components is not None:
+                for item in items:
+                    for component_name, component_value in dst_name_components.items():
+                        setattr(item, component_name, component_value)
+            futures = [write_pool.submit(write_batch, items[i:i + write_batch_size]) for i in range(0, len(items), write_batch_size)]
+            return futures, len(items)
+
+        def finish_chunk(chunk: Tuple[datetime.datetime, datetime.datetime], count: int):
+            written[0] += count
+            if checkpoint is not None:
+                checkpoint.save(cursor=format_time(chunk[1]))
+            if progress is not None:
+                progress(chunk[1], written[0])
+
+        with ThreadPoolExecutor(max_workers=read_concurrency) as read_pool, \
+                ThreadPoolExecutor(max_workers=write_concurrency) as write_pool:
+            ChunkPipeline(lambda chunk: read_pool.submit(read_chunk, chunk), write_chunk, finish_chunk,
+                          max_reads=read_concurrency, max_writes=write_concurrency).run(chunks)
+
+        return written[0]
@@ -0,0 +1,214 @@
+"""
+Columnar layout of loaded measurements, shared by the shared memory transport and by loads spilled to disk.
+
+Each value of a measurement class is one NumPy column, in schema order, plus a time_point column of int64
+nanoseconds since epoch in UTC. String columns (string fields, tags and name components) are int32 codes into
+categories, with -1 for null. Nullable numeric and boolean columns have a mask column, True where the value is null.
+"""
+import datetime
+from enum import Enum
+from typing import List, Type, Optional, Dict, Tuple, Any, Iterator, TYPE_CHECKING
+
+import numpy as np
+import pytz
+
+from . import Measurement, MeasurementUtils, _rebuild_measurement
+from .fields import FieldType, Field, MultipleChoiceStringField, EnumStringField, MultipleChoiceIntegerField, EnumIntegerField
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+TIME_COLUMN = 'time_point'
+
+
+class ColumnarMeasurements:
+    """
+    Read access to measurements stored as columns: row selection by string values, decoded values, measurement
+    instances and DataFrames. Subclasses provide the column buffers.
+    """
+
+    def __init__(self, measurement_type: Type[Measurement], length: int, columns: Dict[str, np.ndarray],
+                 masks: Dict[str, np.ndarray], categories: Dict[str, List[Any]], tz: Optional[datetime.tzinfo] = pytz.utc):
+        self.measurement_type = measurement_type
+        self.length = length
+        self.columns = columns
+        self.masks = masks
+        self.categories = categories
+        self.tz = tz
+
+    def __len__(self) -> int:
+        return self.length
+
+    def where(self, **values: Any) -> np.ndarray:
+        """
+        Row indexes where the given string columns (e.g. tags) have the given values.
+        """
+        selected = np.ones(self.length, dtype=np.bool_)
+        for name, value in values.items():
+            categories = self.categories[name]
+            if value not in categories:
+                return np.zeros(0, dtype=np.int64)
+            selected &= self.columns[name] == categories.index(value)
+        return np.flatnonzero(selected)
+
+    def get_values(self, name: str) -> np.ndarray:
+        """
+        Values of a column as an object array with None for nulls, decoding string codes. Unlike columns, this copies.
+        """
+        column = self.columns[name]
+        if name in self.categories:
+            lookup = np.empty(len(self.categories[name]) + 1, dtype=object)
+            lookup[:-1] = self.categories[name]
+            lookup[-1] = None
+            return lookup[column]
+        values = column.astype(object)
+        if name in self.masks:
+            values[self.masks[name]] = None
+        return values
+
+    def get_time_points(self) -> np.ndarray:
+        return self.columns[TIME_COLUMN].view('datetime64[ns]')
+
+    def __getitem__(self, index: int) -> Measurement:
+        """
+        Measurement instance of one row, built from the columns without validation.
+        """
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError('Row index ' + str(index) + ' out of range for ' + str(self.length) + ' rows')
+        value_names = Measurement.get_value_names(self.measurement_type)
+        values = []
+        for name in value_names:
+            if name in self.masks and self.masks[name][index]:
+                values.append(None)
+            elif name in self.categories:
+                code = self.columns[name][index]
+                values.append(None if code < 0 else self.categories[name][code])
+            else:
+                values.append(self.columns[name][index].item())
+        time_point = datetime.datetime.fromtimestamp(int(self.columns[TIME_COLUMN][index]) / 1e9, tz=pytz.utc)
+        if self.tz is not None:
+            time_point = time_point.astimezone(self.tz)
+        return _rebuild_measurement(self.measurement_type, time_point, tuple(values))
+
+    def __iter__(self) -> Iterator[Measurement]:
+        for index in range(self.length):
+            yield self[index]
+
+    def _get_option_codes(self, name: str, options: List[Any]) -> np.ndarray:
+        """
+        Codes of a column into the given sorted options, -1 for null.
+        """
+        column = self.columns[name]
+        if name in self.categories:
+            code_of_option = {option: i for i, option in enumerate(options)}
+            lookup = np.array([code_of_option[c] for c in self.categories[name]] + [-1], dtype=np.int32)
+            return lookup[column]
+        codes = np.searchsorted(np.array(options), column).astype(np.int32)
+        if name in self.masks:
+            codes[self.masks[name]] = -1
+        return codes
+
+    def to_dataframe(self) -> 'DataFrame':
+        """
+        DataFrame with the same columns as MeasurementUtils.to_dataframe. Numeric columns without nulls reference the
+        column buffers, so the DataFrame must not outlive them.
+        """
+        import pandas
+        column_names = MeasurementUtils.get_dataframe_column_names(self.measurement_type)
+        type_dicts = self.measurement_type.__dict__
+        data = {}
+        for name in column_names.keys():
+            values = self.columns[name]
+            element = type_dicts.get(name)
+            if isinstance(element, (MultipleChoiceStringField, EnumStringField, MultipleChoiceIntegerField, EnumIntegerField)):
+                # categories are the sorted options of the field, like MeasurementUtils.to_dataframe
+                options = sorted(element.options)
+                values = pandas.Categorical.from_codes(self._get_option_codes(name, options), categories=options)
+            elif name in self.categories:
+                values = pandas.Categorical.from_codes(values, categories=self.categories[name])
+            elif name in self.masks and values.dtype == np.int64:
+                values = pandas.arrays.IntegerArray(values, self.masks[name])
+            elif name in self.masks and values.dtype == np.bool_:
+                values = pandas.arrays.BooleanArray(values, self.masks[name])
+            elif name in self.masks and values.dtype == np.float64:
+                values = np.where(self.masks[name], np.nan, values)
+            data[column_names[name]] = values
+        index = pandas.DatetimeIndex(self.get_time_points(), name=TIME_COLUMN).tz_localize('UTC')
+        return pandas.DataFrame(data, index=index, copy=False)
+
+
+def encode_strings(values: List[Any], codes_of_values: Optional[Dict[Any, int]] = None,
+                   categories: Optional[List[Any]] = None) -> Tuple[np.ndarray, List[Any]]:
+    """
+    Codes of string values. Passing codes_of_values and categories of earlier calls extends them, so codes stay
+    the same across chunks of one column.
+    """
+    codes_of_values = codes_of_values if codes_of_values is not None else {}
+    categories = categories if categories is not None else []
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = codes_of_values.get(value)
+        if code is None:
+            code = len(categories)
+            codes_of_values[value] = code
+            categories.append(value)
+        codes[i] = code
+    return codes, categories
+
+
+def encode_measurements(items: List[Measurement], measurement_type: Type[Measurement],
+                        string_codes: Optional[Dict[str, Tuple[Dict[Any, int], List[Any]]]] = None) -> Dict[str, Tuple[np.ndarray, Optional[np.ndarray], Optional[List[Any]]]]:
+    """
+    Columns of items as (values, mask or None, categories or None) by value name.
+
+    :param string_codes: codes and categories of string columns kept across calls, by value name
+    """
+    import pandas
+    columns = {}
+    # noinspection PyProtectedMember
+    items_data = [item._data for item in items]
+    columns[TIME_COLUMN] = (pandas.DatetimeIndex(pandas.to_datetime([item.time_point for item in items], utc=True)).as_unit('ns').asi8.astype(np.int64), None, None)
+    type_dicts = measurement_type.__dict__
+    for name in Measurement.get_value_names(measurement_type):
+        element = type_dicts[name]
+        values = [d.get(name) for d in items_data]
+        if isinstance(element, Field) and element.field_type != FieldType.STRING:
+            dtype = {FieldType.FLOAT: np.float64, FieldType.INTEGER: np.int64, FieldType.BOOLEAN: np.bool_}[element.field_type]
+            mask = np.fromiter((v is None for v in values), dtype=np.bool_, count=len(values))
+            values = [v.value if isinstance(v, Enum) else v for v in values]
+            array = np.fromiter((0 if v is None else v for v in values), dtype=dtype, count=len(values))
+            columns[name] = (array, mask if element.null else None, None)
+        else:
+            values = [v.value if isinstance(v, Enum) else v for v in values]
+            if string_codes is not None:
+                codes_of_values, categories = string_codes.setdefault(name, ({}, []))
+                codes, categories = encode_strings(values, codes_of_values, categories)
+            else:
+                codes, categories = encode_strings(values)
+            columns[name] = (codes, None, categories)
+    return columns
+
+
+def estimate_row_size(measurement_type: Type[Measurement], columnar: bool = False) -> int:
+    """
+    Rough size in bytes of one decoded point: a measurement instance with its values dict, or one row of columns.
+    Repeated strings are interned, so they count as references only.
+    """
+    value_names = Measurement.get_value_names(measurement_type)
+    if not columnar:
+        # instance, values dict, time point and boxed values
+        return 250 + 48 * len(value_names)
+    type_dicts = measurement_type.__dict__
+    size = 8
+    for name in value_names:
+        element = type_dicts[name]
+        if isinstance(element, Field) and element.field_type != FieldType.STRING:
+            size += (1 if element.field_type == FieldType.BOOLEAN else 8) + (1 if element.null else 0)
+        else:
+            size += 4
+    return size
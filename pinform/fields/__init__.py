@@ -105,6 +105,11 @@ class MultipleChoiceStringField(Field):
 class EnumStringField(Field):
 
     def __set__(self, instance, value):
+        if isinstance(value, self.enum):
+            if instance is None:
+                raise Exception('Cannot access field without instance')
+            instance._data[self.name] = value
+            return
         if value is not None and not isinstance(value, str):
             raise TypeError(instance, self.name, str, value)
         if value is not None and not (value in self.options):
@@ -157,6 +162,11 @@ class MultipleChoiceIntegerField(Field):
 class EnumIntegerField(Field):
 
     def __set__(self, instance, value):
+        if isinstance(value, self.enum):
+            if instance is None:
+                raise Exception('Cannot access field without instance')
+            instance._data[self.name] = value
+            return
         if value is not None and not isinstance(value, int):
             raise TypeError(instance, self.name, int, value)
         if value is not None and not (value in self.options):
@@ -177,4 +187,5 @@ class EnumIntegerField(Field):
         for option in options:
             if not isinstance(option, int):
                 raise Exception("Invalid value in enum integer field, " + str(option) + ', expected int value but found ' + str(type(option)))
+        self.enum = enum
         self.options = set(options)
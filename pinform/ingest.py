@@ -0,0 +1,337 @@
+"""
+Parallel bulk ingest of CSV/Parquet files into InfluxDB.
+
+Example:
+    python -m pinform.ingest --model mypkg.models:OHLC --workers 16 --database defaultdb data/*.csv
+
+File columns are mapped to model fields and tags with MeasurementUtils.dataframe_column_to_field_name, so files
+written from MeasurementUtils.to_dataframe can be loaded back as they are.
+"""
+import argparse
+import importlib
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Type, Optional, Dict, Tuple, Iterator, Any
+
+from . import Measurement, MeasurementUtils
+from .fields import FieldType
+from .utils import JsonCheckpoint, ChunkPipeline
+
+logger = logging.getLogger('pinform')
+
+FILE_TYPE_CSV = 'csv'
+FILE_TYPE_PARQUET = 'parquet'
+
+
+def load_model(model_path: str) -> Type[Measurement]:
+    """
+    Import a measurement class given as 'package.module:ClassName'.
+    """
+    if ':' not in model_path:
+        raise Exception('Invalid model path ' + str(model_path) + ', expected format package.module:ClassName')
+    module_name, class_name = model_path.split(':', 1)
+    model = getattr(importlib.import_module(module_name), class_name, None)
+    if model is None or not isinstance(model, type) or not issubclass(model, Measurement):
+        raise Exception('Model ' + str(model_path) + ' is not a subclass of Measurement')
+    return model
+
+
+def get_file_type(path: str) -> str:
+    lower_path = path.lower()
+    if lower_path.endswith('.parquet') or lower_path.endswith('.pq'):
+        return FILE_TYPE_PARQUET
+    elif lower_path.endswith('.csv') or lower_path.endswith('.csv.txt'):
+        return FILE_TYPE_CSV
+    else:
+        raise Exception('Unsupported file type for ' + str(path) + ', expected .csv or .parquet')
+
+
+def iter_file_chunks(path: str, chunk_size: int) -> Iterator[Tuple[int, Any]]:
+    """
+    Yields (chunk index, payload) for a file. For CSV files the payload is the raw text of chunk_size records with
+    the header prepended, so parsing happens in the worker processes. For Parquet files the payload is a row group index.
+    """
+    file_type = get_file_type(path)
+    if file_type == FILE_TYPE_PARQUET:
+        import pyarrow.parquet as pq
+        for row_group in range(pq.ParquetFile(path).num_row_groups):
+            yield row_group, row_group
+        return
+
+    with open(path, 'r', newline='') as f:
+        records = _iter_csv_records(f)
+        header = next(records, '')
+        chunk_index = 0
+        lines = []
+        for record in records:
+            lines.append(record)
+            if len(lines) >= chunk_size:
+                yield chunk_index, header + ''.join(lines)
+                chunk_index += 1
+                lines = []
+        if len(lines) > 0:
+            yield chunk_index, header + ''.join(lines)
+
+
+def _iter_csv_records(lines: Iterator[str]) -> Iterator[str]:
+    """
+    Joins physical lines into CSV records, so a quoted value with embedded newlines stays in one record. A record
+    is complete once its double quotes are balanced, escaped quotes ("") count twice and keep the balance.
+    """
+    record = []
+    quotes = 0
+    for line in lines:
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield ''.join(record)
+            record = []
+            quotes = 0
+    if len(record) > 0:
+        raise Exception('Unterminated quoted value at end of CSV file')
+
+
+def _read_chunk(path: str, payload: Any):
+    import pandas
+    if get_file_type(path) == FILE_TYPE_PARQUET:
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).read_row_group(payload).to_pandas()
+    return pandas.read_csv(io.StringIO(payload))
+
+
+def _chunk_to_measurements(model: Type[Measurement], df, time_column: str) -> List[Measurement]:
+    import pandas
+    if time_column in df.columns:
+        times = pandas.to_datetime(df[time_column], utc=True)
+        df = df.drop(columns=[time_column])
+    else:
+        times = pandas.to_datetime(df.index, utc=True)
+
+    m_fields = Measurement.get_fields(model)
+    m_tags = Measurement.get_tags(model)
+    columns = {}
+    for column_name in df.columns:
+        field_name = MeasurementUtils.dataframe_column_to_field_name(str(column_name))
+        if field_name in m_fields:
+            field_type = m_fields[field_name].field_type
+            column = df[column_name]
+            if field_type == FieldType.INTEGER:
+                column = column.astype('Int64')
+            elif field_type == FieldType.BOOLEAN:
+                column = column.astype('boolean')
+            columns[field_name] = column
+        elif field_name in m_tags:
+            columns[field_name] = df[column_name].astype(str).where(df[column_name].notna())
+        else:
+            raise Exception('Column ' + str(column_name) + ' is not a field or tag of model ' + model.__name__)
+
+    values_df = pandas.DataFrame(columns).astype(object)
+    values_df = values_df.where(values_df.notna(), None)
+    time_points = times.to_pydatetime() if hasattr(times, 'to_pydatetime') else times.dt.to_pydatetime()
+    return [model(time_point=time_point, **row) for time_point, row in zip(time_points, values_df.to_dict('records'))]
+
+
+def serialize_chunk(model_path: str, path: str, payload: Any, time_column: str) -> Tuple[int, str, float, float]:
+    """
+    Parses one chunk of a file and serializes it to line protocol. Runs inside the worker processes.
+
+    :return: (number of rows, line protocol text, parse seconds, serialize seconds)
+    """
+    from influxdb.line_protocol import make_lines
+
+    model = load_model(model_path)
+    t1 = time.monotonic()
+    df = _read_chunk(path, payload)
+    items = _chunk_to_measurements(model, df, time_column)
+    t2 = time.monotonic()
+    points = []
+    for item in items:
+        point = item.get_cli_format()
+        point['time'] = item.time_point
+        points.append(point)
+    lines = make_lines({'points': points}).rstrip('\n') if len(points) > 0 else ''
+    t3 = time.monotonic()
+    return len(items), lines, t2 - t1, t3 - t2
+
+
+class IngestCheckpoint:
+    """
+    Number of leading chunks of a file that are already written, persisted as a small json file so an interrupted
+    ingest can be resumed. Chunk indexes only mean the same rows for the same chunk size and file content, so a
+    checkpoint written with another chunk size or for another size or modification time of the file is discarded
+    and the file is ingested from its start. Rewriting points is harmless, they overwrite themselves.
+    """
+
+    def __init__(self, path: str, checkpoint_dir: Optional[str] = None, chunk_size: Optional[int] = None):
+        file_name = os.path.basename(path) + '.ingest-checkpoint.json'
+        directory = checkpoint_dir if checkpoint_dir is not None else os.path.dirname(os.path.abspath(path))
+        self.checkpoint_path = os.path.join(directory, file_name)
+        stat = os.stat(path)
+        self._checkpoint = JsonCheckpoint(self.checkpoint_path, {'chunk_size': chunk_size, 'file_size': stat.st_size,
+                                                                 'file_mtime_ns': stat.st_mtime_ns})
+        self.completed_chunks = self._checkpoint.state.get('completed_chunks', 0)
+        self.rows = self._checkpoint.state.get('rows', 0)
+
+    def advance(self, rows: int):
+        self.completed_chunks += 1
+        self.rows += rows
+        self._checkpoint.save(completed_chunks=self.completed_chunks, rows=self.rows)
+
+    def clear(self):
+        self.completed_chunks = 0
+        self.rows = 0
+        self._checkpoint.clear()
+
+
+class IngestProgress:
+
+    def __init__(self, report_interval: float = 5.0):
+        self.report_interval = report_interval
+        self.start_time = time.monotonic()
+        self.last_report_time = self.start_time
+        self.chunks = 0
+        self.rows = 0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def add(self, rows: int, num_bytes: int, parse_seconds: float, serialize_seconds: float):
+        self.chunks += 1
+        self.rows += rows
+        self.bytes += num_bytes
+        self.parse_seconds += parse_seconds
+        self.serialize_seconds += serialize_seconds
+
+    def get_summary(self) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        return {
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'elapsed_seconds': elapsed,
+            'rows_per_second': self.rows / elapsed,
+            'megabytes_per_second': self.bytes / elapsed / 1e6,
+            'parse_seconds': self.parse_seconds,
+            'serialize_seconds': self.serialize_seconds,
+        }
+
+    def maybe_report(self, file_path: str, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_report_time < self.report_interval:
+            return
+        self.last_report_time = now
+        summary = self.get_summary()
+        logger.info('{file}: {chunks} chunks, {rows} rows, {rps:.0f} rows/s, {mbps:.2f} MB/s'.format(
+            file=file_path, chunks=summary['chunks'], rows=summary['rows'],
+            rps=summary['rows_per_second'], mbps=summary['megabytes_per_second']))
+
+
+class BulkIngest:
+
+    def __init__(self, model_path: str, client_kwargs: Optional[Dict[str, Any]] = None, workers: Optional[int] = None,
+                 writers: int = 4, chunk_size: int = 50000, time_column: str = 'time_point',
+                 checkpoint_dir: Optional[str] = None, resume: bool = True, dry_run: bool = False):
+        self.model_path = model_path
+        self.model = load_model(model_path)
+        self.client_kwargs = client_kwargs if client_kwargs is not None else {}
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.writers = writers
+        self.chunk_size = chunk_size
+        self.time_column = time_column
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume
+        self.dry_run = dry_run
+        self.progress = IngestProgress()
+        self._local = threading.local()
+
+    def _get_client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            from .client import InfluxClient
+            client = InfluxClient(**self.client_kwargs)
+            self._local.client = client
+        return client
+
+    def _write(self, lines: str) -> bool:
+        if len(lines) == 0:
+            return True
+        return self._get_client().save_lines(lines)
+
+    def ingest_file(self, path: str, process_pool: ProcessPoolExecutor, writer_pool: ThreadPoolExecutor):
+        # parquet chunks are row groups, which do not depend on chunk size
+        chunk_size = self.chunk_size if get_file_type(path) == FILE_TYPE_CSV else None
+        checkpoint = IngestCheckpoint(path, checkpoint_dir=self.checkpoint_dir, chunk_size=chunk_size)
+        if self.dry_run:
+            checkpoint.completed_chunks = 0
+        elif not self.resume:
+            checkpoint.clear()
+        elif checkpoint.completed_chunks > 0:
+            logger.info('{file}: resuming after {chunks} chunks'.format(file=path, chunks=checkpoint.completed_chunks))
+
+        def write(_, result: Tuple[int, str, float, float]):
+            rows, lines, parse_seconds, serialize_seconds = result
+            self.progress.add(rows, len(lines), parse_seconds, serialize_seconds)
+            self.progress.maybe_report(path)
+            if self.dry_run:
+                return [], rows
+            return [writer_pool.submit(self._write, lines)], rows
+
+        def finish(_, rows: int):
+            if not self.dry_run:
+                checkpoint.advance(rows)
+
+        pipeline = ChunkPipeline(lambda payload: process_pool.submit(serialize_chunk, self.model_path, path, payload, self.time_column),
+                                 write, finish, max_reads=self.workers * 2, max_writes=self.writers * 2)
+        pipeline.run(payload for chunk_index, payload in iter_file_chunks(path, self.chunk_size)
+                     if chunk_index >= checkpoint.completed_chunks)
+        self.progress.maybe_report(path, force=True)
+
+    def run(self, paths: List[str]) -> Dict[str, float]:
+        with ProcessPoolExecutor(max_workers=self.workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=self.writers) as writer_pool:
+            for path in paths:
+                self.ingest_file(path, process_pool, writer_pool)
+        return self.progress.get_summary()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m pinform.ingest', description='Bulk ingest CSV/Parquet files into InfluxDB')
+    parser.add_argument('files', nargs='+', help='CSV or Parquet files to ingest')
+    parser.add_argument('--model', required=True, help='measurement class as package.module:ClassName')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8086)
+    parser.add_argument('--username', default=None)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--workers', type=int, default=None, help='parse/serialize processes, defaults to cpu count')
+    parser.add_argument('--writers', type=int, default=4, help='concurrent http writers')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='rows per csv chunk')
+    parser.add_argument('--time-column', default='time_point')
+    parser.add_argument('--checkpoint-dir', default=None, help='directory for checkpoints, defaults to next to each file')
+    parser.add_argument('--no-resume', action='store_true', help='ignore existing checkpoints')
+    parser.add_argument('--dry-run', action='store_true', help='only parse and serialize, do not write')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    sys.path.insert(0, os.getcwd())
+
+    ingest = BulkIngest(model_path=args.model,
+                        client_kwargs={'host': args.host, 'port': args.port, 'username': args.username,
+                                       'password': args.password, 'database_name': args.database},
+                        workers=args.workers, writers=args.writers, chunk_size=args.chunk_size,
+                        time_column=args.time_column, checkpoint_dir=args.checkpoint_dir,
+                        resume=not args.no_resume, dry_run=args.dry_run)
+    summary = ingest.run(args.files)
+    logger.info('done: {rows} rows in {elapsed:.2f}s, {rps:.0f} rows/s (parse {parse:.2f}s, serialize {serialize:.2f}s cpu)'.format(
+        rows=summary['rows'], elapsed=summary['elapsed_seconds'], rps=summary['rows_per_second'],
+        parse=summary['parse_seconds'], serialize=summary['serialize_seconds']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import datetime
+import math
+import threading
+import time
+from enum import Enum
+from typing import List, Type, Optional, Dict, Tuple
+
+from . import Measurement
+from .client import InfluxClient, interval_to_timedelta, parse_influx_str_time
+from .utils import to_utc, _EPOCH
+
+# candidate widths of statistics slices, the smallest giving at most max_slices slices is used
+_SLICE_INTERVALS = ['1s', '10s', '1m', '5m', '15m', '1h', '6h', '1d', '7d', '28d']
+
+
+def timedelta_to_interval(interval: datetime.timedelta) -> str:
+    seconds = int(interval.total_seconds())
+    for unit, unit_seconds in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds % unit_seconds == 0:
+            return str(seconds // unit_seconds) + unit
+    return str(seconds) + 's'
+
+
+class DecodeMode(Enum):
+    # measurement instances, validated per point
+    OBJECT = 'object'
+    # DataFrame columns built straight from query results, without measurement instances
+    COLUMNAR = 'columnar'
+
+
+class MeasurementStats:
+    """
+    Point counts of a measurement per slice of time for one tag filter, with its series cardinality.
+    Slices are aligned to epoch like GROUP BY time().
+    """
+
+    def __init__(self, measurement_name: str, tags: Optional[Dict[str, str]], series_cardinality: int,
+                 slice_interval: datetime.timedelta, time_range: Tuple[datetime.datetime, datetime.datetime],
+                 slice_counts: Dict[datetime.datetime, int]):
+        self.measurement_name = measurement_name
+        self.tags = tags
+        self.series_cardinality = series_cardinality
+        self.slice_interval = slice_interval
+        self.time_range = time_range
+        self.slice_counts = slice_counts
+        self.collected_at = time.monotonic()
+
+    def covers(self, time_range: Tuple[datetime.datetime, datetime.datetime]) -> bool:
+        return self.time_range[0] <= to_utc(time_range[0]) and to_utc(time_range[1]) <= self.time_range[1]
+
+    def get_age(self) -> float:
+        return time.monotonic() - self.collected_at
+
+
+class PlannedChunk:
+    def __init__(self, start: datetime.datetime, end: datetime.datetime, estimated_rows: int, last: bool):
+        self.start = start
+        self.end = end
+        self.estimated_rows = estimated_rows
+        # the last chunk keeps the inclusive end of the requested time range, others are half-open
+        self.last = last
+
+
+class QueryPlan:
+    """
+    How a query over a time range is run: sub-ranges (chunks) queried in parallel with the given concurrency and
+    how results are decoded, together with the estimates they are based on.
+    """
+
+    def __init__(self, measurement_name: str, tags: Optional[Dict[str, str]],
+                 time_range: Tuple[datetime.datetime, datetime.datetime], stats: MeasurementStats, stats_cached: bool,
+                 chunks: List[PlannedChunk], concurrency: int, decode_mode: DecodeMode, target_rows_per_chunk: int,
+                 group_by_time_interval: Optional[str] = None):
+        self.measurement_name = measurement_name
+        self.tags = tags
+        self.time_range = time_range
+        self.stats = stats
+        self.stats_cached = stats_cached
+        self.chunks = chunks
+        self.concurrency = concurrency
+        self.decode_mode = decode_mode
+        self.target_rows_per_chunk = target_rows_per_chunk
+        self.group_by_time_interval = group_by_time_interval
+
+    @property
+    def estimated_rows(self) -> int:
+        return sum(chunk.estimated_rows for chunk in self.chunks)
+
+    def explain(self, max_chunks: int = 10) -> str:
+        lines = ['plan for ' + self.measurement_name + (' ' + ', '.join(t_name + '=' + str(t_value) for t_name, t_value in self.tags.items()) if self.tags else '')]
+        lines.append('  time range: ' + self.time_range[0].isoformat() + ' .. ' + self.time_range[1].isoformat())
+        if self.group_by_time_interval is not None:
+            lines.append('  group by time: ' + self.group_by_time_interval + ', chunk bounds aligned to it')
+        lines.append('  series cardinality: ' + str(self.stats.series_cardinality))
+        lines.append('  statistics: {slices} slices of {interval}, {source}, {age:.1f}s old'.format(
+            slices=len(self.stats.slice_counts), interval=timedelta_to_interval(self.stats.slice_interval),
+            source='cached' if self.stats_cached else 'collected', age=self.stats.get_age()))
+        lines.append('  estimated rows: ' + str(self.estimated_rows))
+        lines.append('  chunks: {count} (target {target} rows), concurrency: {concurrency}, decode: {decode}'.format(
+            count=len(self.chunks), target=self.target_rows_per_chunk, concurrency=self.concurrency,
+            decode=self.decode_mode.value))
+        for index, chunk in enumerate(self.chunks):
+            if index == max_chunks and len(self.chunks) > max_chunks + 1:
+                lines.append('    ... {count} more'.format(count=len(self.chunks) - max_chunks - 1))
+                continue
+            if max_chunks < index < len(self.chunks) - 1:
+                continue
+            lines.append('    [{index}] {start} .. {end} {bound}  ~{rows} rows'.format(
+                index=index, start=chunk.start.isoformat(), end=chunk.end.isoformat(),
+                bound='inclusive' if chunk.last else 'exclusive', rows=chunk.estimated_rows))
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.explain()
+
+
+class QueryPlanner:
+    """
+    Chooses sub-ranges, concurrency and decode mode of load_points, load_points_as_dataframe and
+    get_fields_as_series calls with planned=True.
+
+    Statistics come from two cheap metadata queries, SHOW SERIES CARDINALITY and a COUNT(*) over a coarse
+    GROUP BY time(), and are cached per measurement name and tag filter for stats_max_age seconds. Chunks are cut
+    at slice bounds so each holds about target_rows_per_chunk points. Concurrency is limited to max_concurrency and
+    so that about max_concurrent_series series are scanned at once, which keeps high cardinality measurements from
+    overloading the server. DataFrames of more than columnar_threshold points are decoded column-wise.
+
+        plan = cli.planner.plan_load_points(OHLC, time_range=(start, end))
+        print(plan.explain())
+    """
+
+    def __init__(self, client: InfluxClient, target_rows_per_chunk: int = 50000, max_concurrency: int = 8,
+                 max_concurrent_series: int = 100000, columnar_threshold: int = 100000, max_slices: int = 500,
+                 stats_max_age: Optional[float] = 300.0):
+        self.client = client
+        self.target_rows_per_chunk = target_rows_per_chunk
+        self.max_concurrency = max_concurrency
+        self.max_concurrent_series = max_concurrent_series
+        self.columnar_threshold = columnar_threshold
+        self.max_slices = max_slices
+        self.stats_max_age = stats_max_age
+        self._stats = {}  # type: Dict[Tuple[str, Tuple[Tuple[str, str], ...], datetime.timedelta], MeasurementStats]
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _get_slice_interval(self, time_range: Tuple[datetime.datetime, datetime.datetime],
+                            group_by_time_interval: Optional[str] = None) -> datetime.timedelta:
+        span = to_utc(time_range[1]) - to_utc(time_range[0])
+        slice_interval = None
+        for interval in _SLICE_INTERVALS:
+            slice_interval = interval_to_timedelta(interval)
+            if span / slice_interval <= self.max_slices:
+                break
+        if group_by_time_interval is not None:
+            # chunk bounds are slice bounds, which must not split a group by window
+            window = interval_to_timedelta(group_by_time_interval)
+            slice_interval = window * max(1, math.ceil(slice_interval / window))
+        return slice_interval
+
+    def _collect_stats(self, measurement_name: str, tags: Optional[Dict[str, str]],
+                       time_range: Tuple[datetime.datetime, datetime.datetime],
+                       slice_interval: datetime.timedelta) -> MeasurementStats:
+        cardinality_query = "SHOW SERIES CARDINALITY FROM {measurement_name}".format(measurement_name=measurement_name)
+        tag_conditions = InfluxClient._build_conditions(tags=tags)
+        if len(tag_conditions) > 0:
+            cardinality_query += " WHERE " + (" AND ".join(tag_conditions))
+        cardinality_query += ';'
+        series_cardinality = sum(p.get('count', 0) for p in self.client.db_client.query(cardinality_query).get_points())
+
+        # slices are aligned to epoch, so the first slice may start before the time range
+        start = to_utc(time_range[0])
+        start = start - (start - _EPOCH) % slice_interval
+        end = to_utc(time_range[1])
+        end = end - (end - _EPOCH) % slice_interval + slice_interval
+        # noinspection SqlNoDataSourceInspection
+        count_query = "SELECT COUNT(*) FROM {measurement_name} WHERE ".format(measurement_name=measurement_name)
+        count_query += " AND ".join(InfluxClient._build_conditions(tags=tags, time_range=(start, end), end_exclusive=True))
+        count_query += " GROUP BY time({interval}) FILL(none);".format(interval=timedelta_to_interval(slice_interval))
+        slice_counts = {}
+        for point in self.client.db_client.query(count_query).get_points():
+            counts = [v for k, v in point.items() if k.startswith('count_') and v is not None]
+            if len(counts) > 0:
+                slice_counts[parse_influx_str_time(point['time'])] = max(counts)
+        return MeasurementStats(measurement_name, tags, series_cardinality, slice_interval, (start, end), slice_counts)
+
+    def get_stats(self, measurement_type: Type[Measurement], time_range: Tuple[datetime.datetime, datetime.datetime],
+                  name_components: Optional[Dict[str, str]] = None, tags: Optional[Dict[str, str]] = None,
+                  group_by_time_interval: Optional[str] = None) -> Tuple[MeasurementStats, bool]:
+        """
+        Statistics covering time_range, from cache if fresh enough.
+
+        :return: statistics and whether they were cached
+        """
+        measurement_name = Measurement.get_name(measurement_type, name_components=name_components)
+        slice_interval = self._get_slice_interval(time_range, group_by_time_interval)
+        key = (measurement_name, tuple(sorted((tags or {}).items())), slice_interval)
+        stats = self._stats.get(key)
+        if stats is not None and stats.covers(time_range) and (self.stats_max_age is None or stats.get_age() <= self.stats_max_age):
+            return stats, True
+        stats = self._collect_stats(measurement_name, tags, time_range, slice_interval)
+        with self._lock:
+            self._stats[key] = stats
+        return stats, False
+
+    def _plan(self, measurement_type: Type[Measurement], time_range: Tuple[datetime.datetime, datetime.datetime],
+              name_components: Optional[Dict[str, str]], tags: Optional[Dict[str, str]],
+              group_by_time_interval: Optional[str], columnar: bool) -> QueryPlan:
+        if time_range is None or not isinstance(time_range, tuple) or time_range[0] is None or time_range[1] is None:
+            raise Exception('Planned queries need a time range with both start and end')
+        stats, stats_cached = self.get_stats(measurement_type, time_range, name_components=name_components, tags=tags,
+                                             group_by_time_interval=group_by_time_interval)
+        start, end = to_utc(time_range[0]), to_utc(time_range[1])
+
+        chunks = []
+        chunk_start = start
+        chunk_rows = 0
+        slice_start = start - (start - _EPOCH) % stats.slice_interval
+        while slice_start <= end:
+            slice_end = slice_start + stats.slice_interval
+            chunk_rows += stats.slice_counts.get(slice_start, 0)
+            if chunk_rows >= self.target_rows_per_chunk and slice_end < end:
+                chunks.append(PlannedChunk(chunk_start, slice_end, chunk_rows, last=False))
+                chunk_start = slice_end
+                chunk_rows = 0
+            slice_start = slice_end
+        chunks.append(PlannedChunk(chunk_start, end, chunk_rows, last=True))
+
+        concurrency = max(1, min(self.max_concurrency, len(chunks),
+                                 self.max_concurrent_series // max(1, stats.series_cardinality)))
+        estimated_rows = sum(chunk.estimated_rows for chunk in chunks)
+        decode_mode = DecodeMode.COLUMNAR if columnar and estimated_rows >= self.columnar_threshold else DecodeMode.OBJECT
+        return QueryPlan(stats.measurement_name, tags, (time_range[0], time_range[1]), stats, stats_cached, chunks,
+                         concurrency, decode_mode, self.target_rows_per_chunk, group_by_time_interval=group_by_time_interval)
+
+    def plan_load_points(self, measurement_type: Type[Measurement], time_range: Tuple[datetime.datetime, datetime.datetime],
+                         name_components: Optional[Dict[str, str]] = None, tags: Optional[Dict[str, str]] = None,
+                         as_dataframe: bool = False) -> QueryPlan:
+        """
+        Plan of load_points, or of load_points_as_dataframe with as_dataframe set. Only DataFrames are decoded
+        column-wise, load_points always returns measurement instances.
+        """
+        return self._plan(measurement_type, time_range, name_components, tags, None, columnar=as_dataframe)
+
+    def plan_fields_query(self, measurement_type: Type[Measurement], time_range: Tuple[datetime.datetime, datetime.datetime],
+                          name_components: Optional[Dict[str, str]] = None, tags: Optional[Dict[str, str]] = None,
+                          group_by_time_interval: Optional[str] = None) -> QueryPlan:
+        """
+        Plan of get_fields_as_series. Estimates count scanned points, results are series so decode mode is unused.
+        """
+        return self._plan(measurement_type, time_range, name_components, tags, group_by_time_interval, columnar=False)
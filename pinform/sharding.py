@@ -0,0 +1,305 @@
+import bisect
+import datetime
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Type, Optional, Dict, Union, Tuple, Any, Callable, TYPE_CHECKING
+
+import pytz
+
+from . import MeasurementUtils
+from .client import InfluxClient, AggregationMode, FillMode, AggregationWindowIndex, SaveMode, MemoryLimitMode, T
+
+if TYPE_CHECKING:
+    from pandas import DataFrame, Series
+    from .spill import SpilledMeasurements
+
+logger = logging.getLogger('pinform')
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to shard indexes, with virtual nodes for an even spread.
+    Adding a shard only moves the keys that land on its virtual nodes.
+    """
+
+    def __init__(self, shard_count: int, virtual_nodes: int = 64):
+        if shard_count <= 0:
+            raise Exception('Hash ring needs at least one shard')
+        ring = []
+        for shard_index in range(shard_count):
+            for virtual_index in range(virtual_nodes):
+                ring.append((HashRing.hash_key('shard-' + str(shard_index) + '-' + str(virtual_index)), shard_index))
+        ring.sort()
+        self._hashes = [h for h, _ in ring]
+        self._shards = [s for _, s in ring]
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def get_shard(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, HashRing.hash_key(key))
+        return self._shards[position % len(self._shards)]
+
+
+class ReplicaSet:
+    """
+    Replicas of one shard. Writes go to every replica, reads are balanced round robin over replicas that passed
+    their last health check. Health is re-checked with a ping once it is older than health_check_interval seconds.
+    """
+
+    def __init__(self, clients: List[InfluxClient], health_check_interval: float = 5.0):
+        if len(clients) == 0:
+            raise Exception('Replica set needs at least one client')
+        self.clients = clients
+        self.health_check_interval = health_check_interval
+        self._healthy = [True] * len(clients)
+        self._checked_at = [time.monotonic()] * len(clients)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _is_healthy(self, index: int) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at[index] >= self.health_check_interval:
+            try:
+                self.clients[index].db_client.ping()
+                healthy = True
+            except Exception:
+                logger.debug('health check failed for replica ' + str(index), exc_info=True)
+                healthy = False
+            with self._lock:
+                self._healthy[index] = healthy
+                self._checked_at[index] = now
+        return self._healthy[index]
+
+    def mark_unhealthy(self, client: InfluxClient):
+        index = self.clients.index(client)
+        with self._lock:
+            self._healthy[index] = False
+            self._checked_at[index] = time.monotonic()
+
+    def get_read_clients(self) -> List[InfluxClient]:
+        """
+        Replicas in the order they should be tried for a read, healthy ones first starting from the next round
+        robin position.
+        """
+        start = next(self._next) % len(self.clients)
+        order = [(start + i) % len(self.clients) for i in range(len(self.clients))]
+        healthy = [i for i in order if self._is_healthy(i)]
+        unhealthy = [i for i in order if i not in healthy]
+        return [self.clients[i] for i in healthy + unhealthy]
+
+    def read(self, call: Callable[[InfluxClient], Any]) -> Any:
+        last_exception = None
+        for client in self.get_read_clients():
+            try:
+                return call(client)
+            except Exception as e:
+                logger.warning('read from replica failed, trying next replica: ' + str(e))
+                self.mark_unhealthy(client)
+                last_exception = e
+        raise last_exception
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+
+class ShardedInfluxClient:
+    """
+    Spreads points over several InfluxDB nodes by consistent hashing on the value of one tag (shard_tag).
+
+    Each entry of nodes is the InfluxClient arguments of one shard (host, port, ...) or a list of them for a shard
+    with replicas. Writes are sent to every replica of the owning shard, per shard batches in parallel. Reads with
+    the shard tag in tags go to the owning shard only, other reads fan out to all shards in parallel and are merged.
+    Save modes and planned reads are passed on to every shard. A max_memory budget applies to one shard, so it is
+    only supported for reads with the shard tag in tags.
+
+        cli = ShardedInfluxClient(nodes=[{'host': 'influx1'}, [{'host': 'influx2a'}, {'host': 'influx2b'}]],
+                                  shard_tag='symbol', database_name='defaultdb')
+    """
+
+    def __init__(self, nodes: List[Union[Dict[str, Any], List[Dict[str, Any]]]], shard_tag: str,
+                 database_name: str = 'default', username: str = None, password: str = None,
+                 virtual_nodes: int = 64, max_workers: Optional[int] = None, health_check_interval: float = 5.0):
+        if nodes is None or len(nodes) == 0:
+            raise Exception('Null or empty nodes passed for sharded client')
+        self.shard_tag = shard_tag
+        self.database_name = database_name
+        self.shards = []  # type: List[ReplicaSet]
+        for node in nodes:
+            replicas = node if isinstance(node, list) else [node]
+            clients = []
+            for replica in replicas:
+                client_kwargs = {'database_name': database_name, 'username': username, 'password': password}
+                client_kwargs.update(replica)
+                clients.append(InfluxClient(**client_kwargs))
+            self.shards.append(ReplicaSet(clients, health_check_interval=health_check_interval))
+        self.ring = HashRing(len(self.shards), virtual_nodes=virtual_nodes)
+        self._shard_of_value = {}  # type: Dict[str, int]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers if max_workers is not None else 2 * len(self.shards) + 2)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+    def get_shard_index(self, tag_value: str) -> int:
+        shard_index = self._shard_of_value.get(tag_value)
+        if shard_index is None:
+            shard_index = self.ring.get_shard(str(tag_value))
+            self._shard_of_value[tag_value] = shard_index
+        return shard_index
+
+    def _get_shards_for_tags(self, tags: Optional[Dict[str, str]]) -> List[ReplicaSet]:
+        if tags is not None and tags.get(self.shard_tag) is not None:
+            return [self.shards[self.get_shard_index(tags[self.shard_tag])]]
+        return self.shards
+
+    def _fan_out(self, shards: List[ReplicaSet], call: Callable[[InfluxClient], Any]) -> List[Any]:
+        if len(shards) == 1:
+            return [shards[0].read(call)]
+        futures = [self._executor.submit(shard.read, call) for shard in shards]
+        return [f.result() for f in futures]
+
+    def save_points(self, items: List[T], mode: Union[SaveMode, str] = SaveMode.OVERWRITE,
+                    hash_window: Optional[datetime.timedelta] = None, retention_policy: Optional[str] = None) -> bool:
+        """
+        Writes items to the replicas of their shards, see InfluxClient.save_points for mode, hash_window and
+        retention_policy. Replicas filter points by mode against their own stored points.
+        """
+        shard_items = {}  # type: Dict[int, List[T]]
+        for item in items:
+            # noinspection PyProtectedMember
+            tag_value = item._data.get(self.shard_tag)
+            if tag_value is None:
+                raise ValueError('Null value for shard tag ' + self.shard_tag + ' in point of ' + type(item).__name__)
+            shard_items.setdefault(self.get_shard_index(tag_value), []).append(item)
+
+        futures = []
+        for shard_index, items_of_shard in shard_items.items():
+            for client in self.shards[shard_index].clients:
+                futures.append(self._executor.submit(client.save_points, items_of_shard, mode=mode,
+                                                     hash_window=hash_window, retention_policy=retention_policy))
+        return all([f.result() for f in futures])
+
+    def save_dataframe(self, df: 'DataFrame', measurement_type: Type[T], mode: Union[SaveMode, str] = SaveMode.OVERWRITE,
+                       hash_window: Optional[datetime.timedelta] = None, retention_policy: Optional[str] = None) -> bool:
+        points = MeasurementUtils.from_dataframe(df, measurement_type)
+        return self.save_points(points, mode=mode, hash_window=hash_window, retention_policy=retention_policy)
+
+    def _check_max_memory(self, shards: List[ReplicaSet], max_memory: Optional[int]):
+        if max_memory is not None and len(shards) > 1:
+            raise Exception('max_memory cannot be applied across shards, pass ' + self.shard_tag + ' in tags to query a single shard')
+
+    def load_points(self, measurement_type: Type[T], name_components: Optional[Dict[str, str]] = None,
+                    tags: Optional[Dict[str, str]] = None,
+                    time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                    limit: Optional[int] = None, tz: pytz.UTC = pytz.utc,
+                    intern_values: bool = True, decode_enums: bool = False, max_memory: Optional[int] = None,
+                    memory_limit_mode: Union[MemoryLimitMode, str] = MemoryLimitMode.SPILL,
+                    spill_directory: Optional[str] = None, planned: bool = False) -> Union[List[T], 'SpilledMeasurements']:
+        shards = self._get_shards_for_tags(tags)
+        self._check_max_memory(shards, max_memory)
+        results = self._fan_out(shards, lambda client: client.load_points(
+            measurement_type, name_components=name_components, tags=tags, time_range=time_range, limit=limit, tz=tz,
+            intern_values=intern_values, decode_enums=decode_enums, max_memory=max_memory,
+            memory_limit_mode=memory_limit_mode, spill_directory=spill_directory, planned=planned))
+        if len(results) == 1:
+            return results[0]
+        merged = list(heapq.merge(*results, key=lambda item: item.time_point))
+        return merged if limit is None else merged[:limit]
+
+    def load_points_as_dataframe(self, measurement: Type[T], tags: Optional[Dict[str, str]] = None,
+                                 time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                                 limit: Optional[int] = None, tz: datetime.tzinfo = pytz.utc,
+                                 name_components: Optional[Dict[str, str]] = None, max_memory: Optional[int] = None,
+                                 memory_limit_mode: Union[MemoryLimitMode, str] = MemoryLimitMode.SPILL,
+                                 spill_directory: Optional[str] = None, planned: bool = False) -> 'DataFrame':
+        shards = self._get_shards_for_tags(tags)
+        self._check_max_memory(shards, max_memory)
+        if len(shards) == 1:
+            return shards[0].read(lambda client: client.load_points_as_dataframe(
+                measurement, tags=tags, time_range=time_range, limit=limit, tz=tz, name_components=name_components,
+                max_memory=max_memory, memory_limit_mode=memory_limit_mode, spill_directory=spill_directory,
+                planned=planned))
+        return MeasurementUtils.to_dataframe(self.load_points(measurement, name_components=name_components, tags=tags,
+                                                              time_range=time_range, limit=limit, tz=tz, planned=planned))
+
+    def get_fields_as_series(self, measurement: Type[T],
+                             field_aggregations: Dict[str, Optional[List[AggregationMode]]],
+                             name_components: Optional[Dict[str, str]] = None,
+                             tags: Optional[Dict[str, str]] = None, group_by_time_interval: Optional[str] = None,
+                             fill_mode: Optional[FillMode] = None, fill_number: Optional[int] = None,
+                             window_index_location: AggregationWindowIndex = AggregationWindowIndex.START,
+                             time_range: Union[datetime.date, Tuple[datetime.datetime, datetime.datetime]] = None,
+                             limit: Optional[int] = None, tz: pytz.UTC = pytz.utc, planned: bool = False) -> Dict[str, 'Series']:
+        """
+        Queries spanning several shards can only be merged for raw fields and COUNT, SUM, MIN and MAX aggregations,
+        other aggregations need the shard tag in tags. With limit, every shard returns its first limit windows, which
+        include all windows among the first limit of the merged result. Number, previous and linear fills are applied
+        after merging, since a shard filling windows it has no points in would change the merged values.
+        """
+        shards = self._get_shards_for_tags(tags)
+        if field_aggregations is None or len(field_aggregations.items()) == 0:
+            raise Exception('Null or invalid field aggregations')
+        merge_modes = {}
+        if len(shards) > 1:
+            for field_name, aggregation_modes in field_aggregations.items():
+                for aggregation_mode in (aggregation_modes or [AggregationMode.NONE]):
+                    if aggregation_mode not in (AggregationMode.NONE, AggregationMode.COUNT, AggregationMode.SUM,
+                                                AggregationMode.MIN, AggregationMode.MAX):
+                        raise Exception('Aggregation ' + aggregation_mode.get_str() + ' cannot be merged across shards, pass '
+                                        + self.shard_tag + ' in tags to query a single shard')
+                    merge_modes[aggregation_mode.get_result_field_name(field_name)] = aggregation_mode
+
+        shard_fill_mode, shard_fill_number = fill_mode, fill_number
+        if len(shards) > 1 and fill_mode in (FillMode.NUMBER, FillMode.PREVIOUS, FillMode.LINEAR):
+            # a shard without points in a window would fill it on its own, so shards leave windows null and the fill
+            # is applied to the merged windows
+            shard_fill_mode, shard_fill_number = FillMode.NULL, None
+        results = self._fan_out(shards, lambda client: client.get_fields_as_series(
+            measurement, field_aggregations, name_components=name_components, tags=tags,
+            group_by_time_interval=group_by_time_interval, fill_mode=shard_fill_mode, fill_number=shard_fill_number,
+            window_index_location=window_index_location, time_range=time_range, limit=limit, tz=tz, planned=planned))
+        if len(results) == 1:
+            return results[0]
+
+        import pandas
+        result_dict = {}
+        for result_field_name, aggregation_mode in merge_modes.items():
+            shard_series = [r[result_field_name] for r in results]
+            if aggregation_mode == AggregationMode.NONE:
+                merged = pandas.concat(shard_series).sort_index(kind='stable')
+                result_dict[result_field_name] = merged if limit is None else merged.iloc[:limit]
+                continue
+            columns = pandas.concat(shard_series, axis=1, sort=True)
+            if aggregation_mode == AggregationMode.MIN:
+                merged = columns.min(axis=1)
+            elif aggregation_mode == AggregationMode.MAX:
+                merged = columns.max(axis=1)
+            else:
+                merged = columns.sum(axis=1, min_count=1)
+            merged = merged.sort_index()
+            if fill_mode == FillMode.NUMBER:
+                merged = merged.fillna(fill_number)
+            elif fill_mode == FillMode.PREVIOUS:
+                merged = merged.ffill()
+            elif fill_mode == FillMode.LINEAR:
+                # windows left null by every shard make the merged column an object column
+                merged = pandas.to_numeric(merged).interpolate(method='linear', limit_area='inside')
+            result_dict[result_field_name] = merged if limit is None else merged.iloc[:limit]
+        return result_dict
+
+    def get_distinct_existing_tag_values(self, tag_name: str, measurement: Optional[Type[T]] = None, name_components: Dict[str, str] = None):
+        results = self._fan_out(self.shards, lambda client: client.get_distinct_existing_tag_values(
+            tag_name, measurement=measurement, name_components=name_components))
+        tag_values_set = set()
+        for tag_values in results:
+            tag_values_set.update(tag_values)
+        return list(tag_values_set)
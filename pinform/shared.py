@@ -0,0 +1,223 @@
+"""
+Shared memory transport of loaded measurements to worker processes.
+
+A loaded result is exported once, column by column in schema order, into one multiprocessing.shared_memory block.
+Only the small SharedMeasurementsDescriptor is sent to workers, which attach to the block and read the columns as
+NumPy arrays without copying:
+
+    with export_to_shared_memory(cli.load_points_as_dataframe(OHLC), OHLC) as shared:
+        with multiprocessing.Pool() as pool:
+            pool.map(compute, [(shared.descriptor, symbol) for symbol in symbols])
+
+    def compute(args):
+        descriptor, symbol = args
+        with attach_shared_memory(descriptor) as block:
+            close = block.columns['close'][block.where(symbol=symbol)]
+"""
+import datetime
+from multiprocessing import shared_memory
+from typing import List, Type, Optional, Dict, Tuple, Any, Union, TYPE_CHECKING
+
+import numpy as np
+import pytz
+
+from . import Measurement, MeasurementUtils
+from .columnar import ColumnarMeasurements, TIME_COLUMN, encode_measurements
+from .fields import FieldType
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+_ALIGNMENT = 8
+
+
+class SharedColumn:
+    """
+    Location of one column inside the shared memory block. String columns (string fields, tags and name components)
+    are stored as int32 codes into categories, with -1 for null. Nullable numeric and boolean columns have a mask
+    column, True where the value is null.
+
+    Categories are stored in the block as well, so the descriptor stays small however many there are. String
+    categories are an int64 array of end positions followed by their UTF-8 bytes, other categories (from categorical
+    DataFrame columns) a NumPy array of categories_dtype.
+    """
+
+    def __init__(self, name: str, dtype: str, offset: int, mask_offset: Optional[int] = None,
+                 categories_offset: Optional[int] = None, categories_count: int = 0, categories_dtype: str = 'str'):
+        self.name = name
+        self.dtype = dtype
+        self.offset = offset
+        self.mask_offset = mask_offset
+        self.categories_offset = categories_offset
+        self.categories_count = categories_count
+        self.categories_dtype = categories_dtype
+
+
+class SharedMeasurementsDescriptor:
+    """
+    Small picklable description of an exported result: shared memory block name, measurement class, row count and
+    column locations.
+    """
+
+    def __init__(self, shm_name: str, measurement_type: Type[Measurement], length: int, columns: List[SharedColumn],
+                 tz: Optional[datetime.tzinfo] = pytz.utc):
+        self.shm_name = shm_name
+        self.measurement_type = measurement_type
+        self.length = length
+        self.columns = columns
+        self.tz = tz
+
+
+class SharedMeasurements(ColumnarMeasurements):
+    """
+    Columns of an exported result backed by a shared memory block. The exporting process owns the block and should
+    unlink it when workers are done, attached processes only close it.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, descriptor: SharedMeasurementsDescriptor, owner: bool):
+        self.shm = shm
+        self.descriptor = descriptor
+        self.owner = owner
+        columns = {}  # type: Dict[str, np.ndarray]
+        masks = {}  # type: Dict[str, np.ndarray]
+        categories = {}  # type: Dict[str, List[Any]]
+        for column in descriptor.columns:
+            columns[column.name] = np.ndarray((descriptor.length,), dtype=column.dtype, buffer=shm.buf, offset=column.offset)
+            if column.mask_offset is not None:
+                masks[column.name] = np.ndarray((descriptor.length,), dtype=np.bool_, buffer=shm.buf, offset=column.mask_offset)
+            if column.categories_offset is not None:
+                categories[column.name] = _decode_categories(shm.buf, column)
+        super().__init__(descriptor.measurement_type, descriptor.length, columns, masks, categories, tz=descriptor.tz)
+
+    def close(self):
+        self.columns = {}
+        self.masks = {}
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def __enter__(self) -> 'SharedMeasurements':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+
+def _encode_categories(categories: List[Any]) -> Tuple[np.ndarray, str]:
+    """
+    Categories as bytes to store in the block, and their dtype name.
+    """
+    if all(isinstance(c, str) for c in categories):
+        encoded = [c.encode('utf-8') for c in categories]
+        ends = np.cumsum([len(e) for e in encoded], dtype=np.int64) if encoded else np.empty(0, dtype=np.int64)
+        return np.frombuffer(ends.tobytes() + b''.join(encoded), dtype=np.uint8), 'str'
+    array = np.asarray(categories)
+    if array.dtype.kind not in 'biuf':
+        raise Exception('Categories of mixed or unsupported types cannot be exported to shared memory')
+    return np.frombuffer(array.tobytes(), dtype=np.uint8), array.dtype.name
+
+
+def _decode_categories(buf: memoryview, column: SharedColumn) -> List[Any]:
+    count = column.categories_count
+    if column.categories_dtype != 'str':
+        return np.ndarray((count,), dtype=column.categories_dtype, buffer=buf, offset=column.categories_offset).tolist()
+    ends = np.ndarray((count,), dtype=np.int64, buffer=buf, offset=column.categories_offset).tolist()
+    start = column.categories_offset + 8 * count
+    data = bytes(buf[start:start + (ends[-1] if count > 0 else 0)])
+    return [data[begin:end].decode('utf-8') for begin, end in zip([0] + ends[:-1], ends)]
+
+
+def _encode_dataframe(df: 'DataFrame', measurement_type: Type[Measurement]) -> Dict[str, Tuple[np.ndarray, Optional[np.ndarray], Optional[List[Any]]]]:
+    import pandas
+    columns = {}
+    index = pandas.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    columns[TIME_COLUMN] = (index.as_unit('ns').asi8.astype(np.int64), None, None)
+    column_names = MeasurementUtils.get_dataframe_column_names(measurement_type)
+    fields = Measurement.get_fields(measurement_type)
+    for name, column_name in column_names.items():
+        column = df[column_name]
+        field = fields.get(name)
+        if field is None or field.field_type == FieldType.STRING or isinstance(column.dtype, pandas.CategoricalDtype):
+            categorical = pandas.Categorical(column)
+            columns[name] = (categorical.codes.astype(np.int32), None, [c.item() if hasattr(c, 'item') else c for c in categorical.categories])
+            continue
+        dtype = {FieldType.FLOAT: np.float64, FieldType.INTEGER: np.int64, FieldType.BOOLEAN: np.bool_}[field.field_type]
+        mask = column.isna().to_numpy()
+        array = column.to_numpy(dtype=dtype, na_value=0) if mask.any() else column.to_numpy(dtype=dtype)
+        columns[name] = (array, mask if field.null else None, None)
+    return columns
+
+
+def export_to_shared_memory(data: Union[List[Measurement], 'DataFrame'], measurement_type: Optional[Type[Measurement]] = None,
+                            tz: Optional[datetime.tzinfo] = pytz.utc) -> SharedMeasurements:
+    """
+    Copies a result of load_points (list of measurements) or load_points_as_dataframe into a new shared memory block.
+
+    :param data: list of measurements or DataFrame with MeasurementUtils.to_dataframe columns
+    :param measurement_type: measurement class, needed for DataFrames
+    :param tz: timezone of time points of measurements read back from the block
+    :return: owner of the block, pass its descriptor to workers
+    """
+    if isinstance(data, list):
+        if len(data) > 0:
+            measurement_type = type(data[0]) if measurement_type is None else measurement_type
+            for item in data:
+                if type(item) != measurement_type:
+                    raise Exception("Items passed to export to shared memory must have same type")
+        if measurement_type is None:
+            raise Exception('Measurement type needed to export empty list to shared memory')
+        encoded = encode_measurements(data, measurement_type)
+    else:
+        if measurement_type is None:
+            raise Exception('Measurement type needed to export DataFrame to shared memory')
+        encoded = _encode_dataframe(data, measurement_type)
+
+    length = len(encoded[TIME_COLUMN][0])
+    layout = []
+    encoded_categories = {}  # type: Dict[str, np.ndarray]
+    total_size = 0
+    for name, (array, mask, categories) in encoded.items():
+        offset = total_size
+        total_size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        mask_offset = None
+        if mask is not None:
+            mask_offset = total_size
+            total_size += -(-mask.nbytes // _ALIGNMENT) * _ALIGNMENT
+        column = SharedColumn(name, array.dtype.name, offset, mask_offset=mask_offset)
+        if categories is not None:
+            category_bytes, column.categories_dtype = _encode_categories(categories)
+            column.categories_offset = total_size
+            column.categories_count = len(categories)
+            total_size += -(-category_bytes.nbytes // _ALIGNMENT) * _ALIGNMENT
+            encoded_categories[name] = category_bytes
+        layout.append(column)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(total_size, 1))
+    for column in layout:
+        array, mask, _ = encoded[column.name]
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=column.offset)[:] = array
+        if mask is not None:
+            np.ndarray(mask.shape, dtype=np.bool_, buffer=shm.buf, offset=column.mask_offset)[:] = mask
+        if column.categories_offset is not None:
+            category_bytes = encoded_categories[column.name]
+            shm.buf[column.categories_offset:column.categories_offset + category_bytes.nbytes] = category_bytes
+
+    descriptor = SharedMeasurementsDescriptor(shm.name, measurement_type, length, layout, tz=tz)
+    return SharedMeasurements(shm, descriptor, owner=True)
+
+
+def attach_shared_memory(descriptor: SharedMeasurementsDescriptor) -> SharedMeasurements:
+    """
+    Attaches to a block exported with export_to_shared_memory, usually inside a worker process.
+    """
+    try:
+        # python 3.13+, the exporting process is responsible for unlinking the block
+        shm = shared_memory.SharedMemory(name=descriptor.shm_name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=descriptor.shm_name)
+    return SharedMeasurements(shm, descriptor, owner=False)
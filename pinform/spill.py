@@ -0,0 +1,107 @@
+"""
+Loads spilled to memory-mapped temp files once decoded points exceed a memory budget.
+
+Chunks of decoded points are appended column by column to one file per column (see columnar module for the layout)
+and the finished result maps the files read-only, so the operating system pages column data in and out instead of
+the process holding it.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+from typing import List, Type, Optional, Dict, Any, BinaryIO
+
+import numpy as np
+import pytz
+
+from . import Measurement
+from .columnar import ColumnarMeasurements, encode_measurements
+
+
+class SpilledMeasurements(ColumnarMeasurements):
+    """
+    Result of a load spilled to disk, a read-only sequence of measurements backed by memory-mapped columns.
+    Temp files are removed on close or once this object is garbage collected. Mapped columns stay readable after
+    that on POSIX systems, so DataFrames from to_dataframe can outlive it.
+    """
+
+    def __init__(self, directory: str, measurement_type: Type[Measurement], length: int, columns: Dict[str, np.ndarray],
+                 masks: Dict[str, np.ndarray], categories: Dict[str, List[Any]], tz=pytz.utc):
+        super().__init__(measurement_type, length, columns, masks, categories, tz=tz)
+        self.directory = directory
+        self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+
+    def close(self):
+        self.columns = {}
+        self.masks = {}
+        self._finalizer()
+
+    def __enter__(self) -> 'SpilledMeasurements':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SpillWriter:
+    """
+    Appends chunks of measurements to column files in a new temp directory, keeping string codes consistent across
+    chunks.
+
+        writer = SpillWriter(OHLC)
+        for chunk in chunks:
+            writer.append(chunk)
+        spilled = writer.finish()
+    """
+
+    def __init__(self, measurement_type: Type[Measurement], directory: Optional[str] = None, tz=pytz.utc):
+        self.measurement_type = measurement_type
+        self.tz = tz
+        self.directory = tempfile.mkdtemp(prefix='pinform-spill-', dir=directory)
+        self.length = 0
+        self._files = {}  # type: Dict[str, BinaryIO]
+        self._dtypes = {}  # type: Dict[str, np.dtype]
+        self._masked = set()
+        self._string_codes = {}  # type: Dict[str, tuple]
+
+    def _get_file(self, name: str) -> BinaryIO:
+        f = self._files.get(name)
+        if f is None:
+            f = open(os.path.join(self.directory, name), 'wb')
+            self._files[name] = f
+        return f
+
+    def append(self, items: List[Measurement]):
+        if len(items) == 0:
+            return
+        encoded = encode_measurements(items, self.measurement_type, string_codes=self._string_codes)
+        for name, (array, mask, _) in encoded.items():
+            self._dtypes[name] = array.dtype
+            self._get_file(name).write(array.tobytes())
+            if mask is not None:
+                self._masked.add(name)
+                self._get_file(name + '.mask').write(mask.tobytes())
+        self.length += len(items)
+
+    def finish(self) -> SpilledMeasurements:
+        for f in self._files.values():
+            f.close()
+        if self.length == 0:
+            encoded = encode_measurements([], self.measurement_type)
+            columns = {name: array for name, (array, _, _) in encoded.items()}
+            masks = {name: mask for name, (_, mask, _) in encoded.items() if mask is not None}
+            categories = {name: c for name, (_, _, c) in encoded.items() if c is not None}
+        else:
+            columns = {}
+            masks = {}
+            categories = {name: codes[1] for name, codes in self._string_codes.items()}
+            for name, dtype in self._dtypes.items():
+                columns[name] = np.memmap(os.path.join(self.directory, name), dtype=dtype, mode='r', shape=(self.length,))
+                if name in self._masked:
+                    masks[name] = np.memmap(os.path.join(self.directory, name + '.mask'), dtype=np.bool_, mode='r', shape=(self.length,))
+        return SpilledMeasurements(self.directory, self.measurement_type, self.length, columns, masks, categories, tz=self.tz)
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
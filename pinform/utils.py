@@ -1,3 +1,16 @@
+import datetime
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple, Callable, Iterable
+
+import pytz
+
+logger = logging.getLogger('pinform')
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
 
 
 def dromedary_to_underline(s: str) -> str:
@@ -20,3 +33,121 @@ def underline_to_dromedary(s: str) -> str:
             else:
                 sp += x.lower()
     return sp
+
+
+def to_utc(time_point: datetime.datetime) -> datetime.datetime:
+    """
+    Timezone aware UTC datetime of a time point, naive time points are taken as UTC like influxdb does.
+    """
+    if time_point.tzinfo is None:
+        return pytz.utc.localize(time_point)
+    return time_point.astimezone(pytz.utc)
+
+
+class ValueInterner(object):
+    """
+    Bounded table mapping decoded values (tag values, option strings) to one shared instance, so repeated values of
+    low cardinality columns do not get their own copy per row. Once max_size distinct values are stored, new values
+    are returned as they are.
+    """
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._table = {}  # type: dict
+
+    def intern(self, value: Any) -> Any:
+        shared = self._table.get(value)
+        if shared is not None:
+            return shared
+        if value is not None and len(self._table) < self.max_size:
+            self._table[value] = value
+        return value
+
+    def clear(self):
+        self._table.clear()
+
+    def __len__(self):
+        return len(self._table)
+
+
+class JsonCheckpoint(object):
+    """
+    State of a resumable job persisted as a small json file, together with the identity of the job it was written
+    for (e.g. input file and chunk size). A checkpoint of another identity is discarded with a warning, so the job
+    starts over instead of skipping work of a different job.
+    """
+
+    def __init__(self, path: str, identity: Dict[str, Any]):
+        self.path = path
+        self.identity = identity
+        self.state = {}  # type: Dict[str, Any]
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            mismatched = [key for key, value in identity.items() if saved.get(key) != value]
+            if len(mismatched) > 0:
+                logger.warning('{path}: checkpoint does not match current {keys}, starting over'.format(
+                    path=path, keys=', '.join(mismatched)))
+            else:
+                self.state = {key: value for key, value in saved.items() if key not in identity}
+
+    def save(self, **state: Any):
+        self.state = state
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({**state, **self.identity}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.state = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ChunkPipeline(object):
+    """
+    Bounded two stage pipeline over chunks of a job: chunks are read (queried, parsed) concurrently, then their
+    writes are sent concurrently, and chunks are finished in their original order once all their writes completed.
+    A checkpoint saved when a chunk finishes therefore covers every chunk before it. At most max_reads reads and the
+    writes of max_writes chunks are pending at once, which bounds memory however many chunks there are.
+
+    :param read: submits the read of a chunk and returns its future
+    :param write: called in chunk order with (chunk, read result), submits the writes of the chunk and returns their
+        futures with a value passed on to finish
+    :param finish: called in chunk order with (chunk, value returned by write) once the writes of the chunk completed
+    """
+
+    def __init__(self, read: Callable[[Any], Future], write: Callable[[Any, Any], Tuple[List[Future], Any]],
+                 finish: Callable[[Any, Any], None], max_reads: int, max_writes: int):
+        self.read = read
+        self.write = write
+        self.finish = finish
+        self.max_reads = max(max_reads, 1)
+        self.max_writes = max(max_writes, 1)
+        self._reads = deque()
+        self._writes = deque()
+
+    def _finish_oldest_write(self):
+        chunk, futures, value = self._writes.popleft()
+        for future in futures:
+            future.result()
+        self.finish(chunk, value)
+
+    def _finish_oldest_read(self):
+        chunk, future = self._reads.popleft()
+        result = future.result()
+        # room is made before submitting, so no more than max_writes chunks have pending writes
+        while len(self._writes) >= self.max_writes:
+            self._finish_oldest_write()
+        futures, value = self.write(chunk, result)
+        self._writes.append((chunk, futures, value))
+
+    def run(self, chunks: Iterable[Any]):
+        for chunk in chunks:
+            while len(self._reads) >= self.max_reads:
+                self._finish_oldest_read()
+            self._reads.append((chunk, self.read(chunk)))
+        while len(self._reads) > 0:
+            self._finish_oldest_read()
+        while len(self._writes) > 0:
+            self._finish_oldest_write()
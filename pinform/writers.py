@@ -0,0 +1,218 @@
+import datetime
+import logging
+import math
+import threading
+from enum import Enum
+from typing import Dict, List, Optional, Type, Any
+
+from . import Measurement
+from .client import InfluxClient, AggregationMode
+from .utils import to_utc, _EPOCH
+
+logger = logging.getLogger('pinform')
+
+
+class RunningAggregate:
+    """
+    Running aggregates of one field inside one window, updated in constant time per value
+    except for median which keeps the values of the window.
+    """
+    __slots__ = ('count', 'total', 'mean', 'm2', 'min', 'max', 'first', 'first_time', 'last', 'last_time', 'values')
+
+    def __init__(self, keep_values: bool = False):
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.first_time = None
+        self.last = None
+        self.last_time = None
+        self.values = [] if keep_values else None
+
+    def add(self, value: Any, time_point: datetime.datetime):
+        if value is None:
+            return
+        if isinstance(value, Enum):
+            # enum fields may hold enum members, which are aggregated and written as their values
+            value = value.value
+        self.count += 1
+        if self.first_time is None or time_point < self.first_time:
+            self.first, self.first_time = value, time_point
+        if self.last_time is None or time_point >= self.last_time:
+            self.last, self.last_time = value, time_point
+        if isinstance(value, (str, bool)):
+            return
+        self.total += value
+        # Welford's online algorithm for mean and variance
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        if self.values is not None:
+            self.values.append(value)
+
+    def get(self, mode: AggregationMode) -> Any:
+        if self.count == 0:
+            return None
+        if mode == AggregationMode.COUNT:
+            return self.count
+        elif mode == AggregationMode.FIRST:
+            return self.first
+        elif mode == AggregationMode.LAST:
+            return self.last
+        elif mode == AggregationMode.MIN:
+            return self.min
+        elif mode == AggregationMode.MAX:
+            return self.max
+        elif mode == AggregationMode.SUM:
+            return self.total if self.min is not None else None
+        elif mode == AggregationMode.MEAN:
+            return self.mean if self.min is not None else None
+        elif mode == AggregationMode.SPREAD:
+            return self.max - self.min if self.min is not None else None
+        elif mode == AggregationMode.STDDEV:
+            # influxdb returns the sample standard deviation, which is undefined for a single value
+            return math.sqrt(self.m2 / (self.count - 1)) if self.min is not None and self.count > 1 else None
+        elif mode == AggregationMode.MEDIAN:
+            if not self.values:
+                return None
+            values = sorted(self.values)
+            middle = len(values) // 2
+            return values[middle] if len(values) % 2 == 1 else (values[middle - 1] + values[middle]) / 2.0
+        else:
+            raise Exception('Aggregation mode ' + str(mode) + ' is not supported by aggregating writer')
+
+
+class AggregatingWriter:
+    """
+    Aggregates raw measurements in memory per (resolved measurement name, tag set, time window) and writes one point
+    per closed window, with fields named like get_fields_as_series results (e.g. mean_close, max_close).
+
+    Windows are aligned to epoch like GROUP BY time() and the written point time is the window start. A window is
+    closed once a point later than its end plus allowed_lateness is added; points for already closed windows are
+    dropped and counted in dropped_points.
+
+        with AggregatingWriter(cli, OHLC, window=datetime.timedelta(minutes=1),
+                               field_aggregations={'close': [AggregationMode.MEAN, AggregationMode.LAST]}) as writer:
+            for item in raw_items:
+                writer.add(item)
+    """
+
+    def __init__(self, client: InfluxClient, measurement_type: Type[Measurement], window: datetime.timedelta,
+                 field_aggregations: Dict[str, List[AggregationMode]],
+                 allowed_lateness: datetime.timedelta = datetime.timedelta(0),
+                 output_measurement_name: Optional[str] = None, flush_on_close: bool = True):
+        if window <= datetime.timedelta(0):
+            raise Exception('Aggregation window must be positive but found ' + str(window))
+        if field_aggregations is None or len(field_aggregations) == 0:
+            raise Exception('Null or invalid field aggregations')
+        fields = Measurement.get_fields(measurement_type)
+        for field_name, aggregation_modes in field_aggregations.items():
+            if field_name not in fields:
+                raise Exception('Field name ' + str(field_name) + ' not found in measurement ' + measurement_type.measurement_name + ' fields')
+            if aggregation_modes is None or len(aggregation_modes) == 0 or AggregationMode.NONE in aggregation_modes:
+                raise Exception('Aggregating writer needs aggregation modes for field ' + str(field_name))
+
+        self.client = client
+        self.measurement_type = measurement_type
+        self.window = window
+        self.field_aggregations = field_aggregations
+        self.allowed_lateness = allowed_lateness
+        self.output_measurement_name = output_measurement_name
+        self.flush_on_close = flush_on_close
+        self.dropped_points = 0
+        self.written_points = 0
+
+        self._keep_values = {f_name: AggregationMode.MEDIAN in modes for f_name, modes in field_aggregations.items()}
+        # window start -> (measurement name, tag set) -> field name -> aggregate
+        self._windows = {}  # type: Dict[datetime.datetime, Dict[tuple, Dict[str, RunningAggregate]]]
+        self._max_time = None  # type: Optional[datetime.datetime]
+        self._lock = threading.Lock()
+
+    def _get_window_start(self, time_point: datetime.datetime) -> datetime.datetime:
+        return time_point - (time_point - _EPOCH) % self.window
+
+    def _get_watermark(self) -> Optional[datetime.datetime]:
+        return None if self._max_time is None else self._max_time - self.allowed_lateness
+
+    def add(self, item: Measurement):
+        self.add_points([item])
+
+    def add_points(self, items: List[Measurement]):
+        with self._lock:
+            for item in items:
+                time_point = to_utc(item.time_point)
+                window_start = self._get_window_start(time_point)
+                watermark = self._get_watermark()
+                if watermark is not None and window_start + self.window <= watermark:
+                    self.dropped_points += 1
+                    logger.debug('dropped late point at ' + str(time_point) + ' for closed window ' + str(window_start))
+                    continue
+                if self._max_time is None or time_point > self._max_time:
+                    self._max_time = time_point
+
+                # noinspection PyProtectedMember
+                item_data = item._data
+                tags = tuple(sorted((t_name, t_value) for t_name, t_value in item.get_tag_values_as_dict().items() if t_value is not None))
+                key = (item.get_measurement_name(), tags)
+                window_series = self._windows.get(window_start)
+                if window_series is None:
+                    window_series = {}
+                    self._windows[window_start] = window_series
+                aggregates = window_series.get(key)
+                if aggregates is None:
+                    aggregates = {f_name: RunningAggregate(keep_values=self._keep_values[f_name]) for f_name in self.field_aggregations.keys()}
+                    window_series[key] = aggregates
+                for f_name, aggregate in aggregates.items():
+                    aggregate.add(item_data[f_name], time_point)
+            closed_points = self._pop_windows(self._get_watermark())
+        self._write(closed_points)
+
+    def _pop_windows(self, watermark: Optional[datetime.datetime]) -> List[Dict[str, Any]]:
+        points = []
+        for window_start in sorted(self._windows.keys()):
+            if watermark is not None and window_start + self.window > watermark:
+                break
+            for (measurement_name, tags), aggregates in self._windows.pop(window_start).items():
+                fields = {}
+                for f_name, aggregation_modes in self.field_aggregations.items():
+                    for aggregation_mode in aggregation_modes:
+                        value = aggregates[f_name].get(aggregation_mode)
+                        if value is not None:
+                            fields[aggregation_mode.get_result_field_name(f_name)] = value
+                if len(fields) == 0:
+                    continue
+                points.append({
+                    "measurement": self.output_measurement_name if self.output_measurement_name is not None else measurement_name,
+                    "tags": dict(tags),
+                    "time": window_start,
+                    "fields": fields
+                })
+        return points
+
+    def _write(self, points: List[Dict[str, Any]]):
+        if len(points) == 0:
+            return
+        self.client.db_client.write_points(points)
+        self.written_points += len(points)
+
+    def flush(self, include_open_windows: bool = False):
+        """
+        Writes closed windows, and also windows that are still open if include_open_windows is set.
+        """
+        with self._lock:
+            points = self._pop_windows(None if include_open_windows else self._get_watermark())
+        self._write(points)
+
+    def close(self):
+        self.flush(include_open_windows=self.flush_on_close)
+
+    def __enter__(self) -> 'AggregatingWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
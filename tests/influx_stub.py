@@ -0,0 +1,311 @@
+"""
+Local stand-in for an InfluxDB 1.x HTTP endpoint, enough for the client paths under test: /ping, /write with line
+protocol and /query with CREATE DATABASE, SHOW TAG VALUES, SHOW SERIES CARDINALITY and SELECT statements over written
+points, optionally grouped by tags or by time with COUNT, COUNT(*), SUM, MIN and MAX and any fill. Every server keeps
+its own points and the statements it received.
+"""
+import datetime
+import json
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import pytz
+
+_SELECT_REGEX = re.compile(r'^SELECT (?P<select>.+?) FROM (?P<measurement>\S+?)(?: WHERE (?P<where>.+?))?'
+                           r'(?: GROUP BY time\((?P<interval>[0-9]+[smhd])\))?(?P<by_tags> GROUP BY \*)?'
+                           r'(?P<descending> ORDER BY time DESC)?(?: LIMIT (?P<limit>[0-9]+))?'
+                           r'(?: FILL\((?P<fill>[^)]*)\))?$')
+_TAG_CONDITION_REGEX = re.compile(r'^"(?P<name>[^"]+)"=\'(?P<value>.*)\'$')
+_TIME_CONDITION_REGEX = re.compile(r'^time (?P<op>>=|<=|<|>) \'(?P<value>[^\']+)\'$')
+_AGGREGATE_REGEX = re.compile(r'^(?P<function>count|sum|min|max)\((?P<field>[^)]+)\) AS (?P<alias>\S+)$')
+_TAG_VALUES_REGEX = re.compile(r'^show tag values(?: from (?P<measurement>\S+))? with key = "(?P<key>[^"]+)"$', re.IGNORECASE)
+_CARDINALITY_REGEX = re.compile(r'^SHOW SERIES CARDINALITY FROM (?P<measurement>\S+?)(?: WHERE (?P<where>.+?))?$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _split_unquoted(text: str, separator: str) -> List[str]:
+    parts = []
+    current = ''
+    quoted = False
+    escaped = False
+    for c in text:
+        if escaped:
+            current += c
+            escaped = False
+        elif c == '\\':
+            current += c
+            escaped = True
+        elif c == '"':
+            current += c
+            quoted = not quoted
+        elif c == separator and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += c
+    parts.append(current)
+    return parts
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r'\\(.)', r'\1', text)
+
+
+def _parse_field_value(text: str) -> Any:
+    if text.startswith('"'):
+        return _unescape(text[1:-1])
+    if text.endswith('i'):
+        return int(text[:-1])
+    if text in ('t', 'T', 'true', 'True', 'TRUE'):
+        return True
+    if text in ('f', 'F', 'false', 'False', 'FALSE'):
+        return False
+    return float(text)
+
+
+def parse_line(line: str) -> Dict[str, Any]:
+    """
+    Parses one line protocol line with nanosecond timestamp to {'measurement', 'tags', 'fields', 'time'}.
+    """
+    series_key, field_set, timestamp = _split_unquoted(line, ' ')
+    key_parts = _split_unquoted(series_key, ',')
+    tags = {}
+    for tag in key_parts[1:]:
+        name, value = tag.split('=', 1)
+        tags[_unescape(name)] = _unescape(value)
+    fields = {}
+    for field in _split_unquoted(field_set, ','):
+        name, value = field.split('=', 1)
+        fields[_unescape(name)] = _parse_field_value(value)
+    return {'measurement': _unescape(key_parts[0]), 'tags': tags, 'fields': fields, 'time': int(timestamp)}
+
+
+def _format_time(ns: int) -> str:
+    dt = datetime.datetime.fromtimestamp(ns // 1000000000, pytz.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_time(time_str: str) -> int:
+    # RFC3339 with Z or offset and up to nanosecond fractions, fractions below microseconds are dropped
+    dt = datetime.datetime.fromisoformat(re.sub(r'(\.[0-9]{6})[0-9]+', r'\1', time_str.replace('Z', '+00:00')))
+    return int(dt.timestamp()) * 1000000000 + dt.microsecond * 1000
+
+
+def _fill_column(rows: List[List[Any]], column: int, fill: str):
+    """
+    Fills null values of one column of grouped rows like FILL(previous), FILL(linear) or FILL(<number>).
+    """
+    if fill in ('null', 'none'):
+        return
+    known = [i for i, row in enumerate(rows) if row[column] is not None]
+    for i, row in enumerate(rows):
+        if row[column] is not None:
+            continue
+        before = [k for k in known if k < i]
+        after = [k for k in known if k > i]
+        if fill == 'previous':
+            row[column] = rows[before[-1]][column] if before else None
+        elif fill == 'linear':
+            if before and after:
+                low, high = before[-1], after[0]
+                row[column] = rows[low][column] + (rows[high][column] - rows[low][column]) * (i - low) / (high - low)
+        else:
+            row[column] = float(fill) if '.' in fill else int(fill)
+
+
+class InfluxStubServer:
+    """
+    Stand-in server on a free local port, started on creation and stopped by close.
+    """
+
+    def __init__(self):
+        self.points = []  # type: List[Dict[str, Any]]
+        self.statements = []  # type: List[str]
+        self.write_count = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code: int, body: Optional[Dict[str, Any]] = None):
+                data = json.dumps(body).encode('utf-8') if body is not None else b''
+                self.send_response(code)
+                self.send_header('X-Influxdb-Version', '1.8.10-stub')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8') if length > 0 else ''
+                if url.path == '/ping':
+                    self._send(204)
+                elif url.path == '/write':
+                    stub.write(body)
+                    self._send(204)
+                elif url.path == '/query':
+                    if 'q' not in params and body:
+                        params.update({k: v[0] for k, v in parse_qs(body).items()})
+                    self._send(200, {'results': stub.query(params.get('q', ''))})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            do_GET = _handle
+            do_POST = _handle
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def write(self, body: str):
+        points = [parse_line(line) for line in body.splitlines() if line.strip()]
+        with self._lock:
+            self.write_count += 1
+            self.points.extend(points)
+
+    def query(self, query_string: str) -> List[Dict[str, Any]]:
+        results = []
+        statements = [s.strip() for s in query_string.split(';') if s.strip()]
+        with self._lock:
+            self.statements.extend(statements)
+        for statement_id, statement in enumerate(statements):
+            result = {'statement_id': statement_id}
+            try:
+                series = self._execute(statement)
+                if series:
+                    result['series'] = series
+            except Exception as e:
+                result['error'] = str(e)
+            results.append(result)
+        return results
+
+    def _show_tag_values(self, measurement: Optional[str], key: str) -> List[Dict[str, Any]]:
+        values = {}  # type: Dict[str, set]
+        with self._lock:
+            for p in self.points:
+                if (measurement is None or p['measurement'] == measurement) and key in p['tags']:
+                    values.setdefault(p['measurement'], set()).add(p['tags'][key])
+        return [{'name': name, 'columns': ['key', 'value'], 'values': [[key, v] for v in sorted(tag_values)]}
+                for name, tag_values in sorted(values.items())]
+
+    @staticmethod
+    def _parse_where(where: Optional[str]) -> Tuple[Optional[int], Optional[int], Dict[str, str]]:
+        """
+        Start (inclusive) and end (exclusive) in nanoseconds and tag values of WHERE conditions.
+        """
+        start, end, tags = None, None, {}
+        if where:
+            for condition in where.split(' AND '):
+                tag_match = _TAG_CONDITION_REGEX.match(condition)
+                time_match = _TIME_CONDITION_REGEX.match(condition)
+                if tag_match is not None:
+                    tags[tag_match.group('name')] = tag_match.group('value')
+                elif time_match is not None:
+                    value = _parse_time(time_match.group('value'))
+                    op = time_match.group('op')
+                    if op in ('>=', '>'):
+                        start = value + (1 if op == '>' else 0)
+                    else:
+                        end = value + (1 if op == '<=' else 0)
+                else:
+                    raise Exception('unsupported condition: ' + condition)
+        return start, end, tags
+
+    def _select_points(self, measurement: str, start: Optional[int], end: Optional[int],
+                       tags: Dict[str, str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            points = [p for p in self.points if p['measurement'] == measurement
+                      and all(p['tags'].get(k) == v for k, v in tags.items())
+                      and (start is None or p['time'] >= start) and (end is None or p['time'] < end)]
+        points.sort(key=lambda p: p['time'])
+        return points
+
+    def _execute(self, statement: str) -> List[Dict[str, Any]]:
+        if statement.upper().startswith('CREATE DATABASE'):
+            return []
+        tag_values_match = _TAG_VALUES_REGEX.match(statement)
+        if tag_values_match is not None:
+            return self._show_tag_values(tag_values_match.group('measurement'), tag_values_match.group('key'))
+        cardinality_match = _CARDINALITY_REGEX.match(statement)
+        if cardinality_match is not None:
+            _, _, tags = self._parse_where(cardinality_match.group('where'))
+            points = self._select_points(cardinality_match.group('measurement'), None, None, tags)
+            cardinality = len({tuple(sorted(p['tags'].items())) for p in points})
+            return [{'columns': ['count'], 'values': [[cardinality]]}] if cardinality > 0 else []
+        match = _SELECT_REGEX.match(statement)
+        if match is None:
+            raise Exception('unsupported statement: ' + statement)
+        start, end, tags = self._parse_where(match.group('where'))
+        points = self._select_points(match.group('measurement'), start, end, tags)
+        limit = int(match.group('limit')) if match.group('limit') else None
+
+        if match.group('interval') is None:
+            if match.group('select') != '*':
+                raise Exception('unsupported select without group by: ' + match.group('select'))
+            if match.group('descending'):
+                points.reverse()
+            groups = {}  # type: Dict[tuple, List[Dict[str, Any]]]
+            for p in points:
+                groups.setdefault(tuple(sorted(p['tags'].items())) if match.group('by_tags') else (), []).append(p)
+            series = []
+            for group_tags, group_points in sorted(groups.items()):
+                group_points = group_points if limit is None else group_points[:limit]
+                names = sorted({n for p in group_points for n in list(p['fields']) + ([] if group_tags else list(p['tags']))})
+                values = [[_format_time(p['time'])] + [p['fields'].get(n, p['tags'].get(n)) for n in names] for p in group_points]
+                series.append({'name': match.group('measurement'), 'columns': ['time'] + names, 'values': values})
+                if group_tags:
+                    series[-1]['tags'] = dict(group_tags)
+            return series
+
+        if match.group('select') == 'COUNT(*)':
+            # one count column per field
+            aggregates = [('count', name, 'count_' + name) for name in sorted({n for p in points for n in p['fields']})]
+        else:
+            aggregates = []
+            for column in match.group('select').split(', '):
+                aggregate_match = _AGGREGATE_REGEX.match(column)
+                if aggregate_match is None:
+                    raise Exception('unsupported aggregate: ' + column)
+                aggregates.append((aggregate_match.group('function'), aggregate_match.group('field'), aggregate_match.group('alias')))
+        interval = match.group('interval')
+        width = int(interval[:-1]) * _UNIT_SECONDS[interval[-1]] * 1000000000
+        windows = {}  # type: Dict[int, List[Dict[str, Any]]]
+        for p in points:
+            windows.setdefault(p['time'] - p['time'] % width, []).append(p)
+        if (match.group('fill') or 'null') == 'none':
+            window_starts = sorted(windows)
+        else:
+            if start is None or end is None:
+                raise Exception('fill(null) needs a bounded time range')
+            window_starts = list(range(start - start % width, end, width))
+        values = []
+        for window_start in window_starts:
+            row = [_format_time(window_start)]
+            for function, field, _ in aggregates:
+                field_values = [p['fields'][field] for p in windows.get(window_start, []) if field in p['fields']]
+                if function == 'count':
+                    row.append(len(field_values))
+                elif len(field_values) == 0:
+                    row.append(None)
+                else:
+                    row.append({'sum': sum, 'min': min, 'max': max}[function](field_values))
+            values.append(row)
+        fill = match.group('fill') or 'null'
+        for column in range(1, len(aggregates) + 1):
+            _fill_column(values, column, fill)
+        values = values if limit is None else values[:limit]
+        columns = ['time'] + [alias for _, _, alias in aggregates]
+        return [{'name': match.group('measurement'), 'columns': columns, 'values': values}] if values else []
@@ -0,0 +1,51 @@
+import datetime
+from enum import Enum
+
+import pytz
+
+from pinform import Measurement
+from pinform.fields import FloatField, IntegerField, BooleanField, MultipleChoiceStringField, EnumIntegerField, \
+    MultipleChoiceIntegerField
+from pinform.tags import Tag
+
+
+class Level(Enum):
+    LOW = 1
+    HIGH = 2
+
+
+class Row(Measurement):
+    """
+    Nullable columns of every kind the columnar layout encodes.
+    """
+    class Meta:
+        measurement_name = 'row'
+
+    symbol = Tag(null=False)
+    price = FloatField(null=True)
+    size = IntegerField(null=True)
+    flag = BooleanField(null=True)
+    side = MultipleChoiceStringField(options=['sell', 'buy'], null=True)
+    level = EnumIntegerField(enum=Level, null=True)
+    bucket = MultipleChoiceIntegerField(options=[30, 10, 20], null=True)
+
+
+START = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+def make_rows():
+    return [Row(time_point=START, symbol='B', price=1.5, size=1, flag=True, side='sell', level=Level.HIGH, bucket=20),
+            Row(time_point=START + datetime.timedelta(seconds=1), symbol='A', price=None, size=None, flag=None,
+                side=None, level=None, bucket=None),
+            Row(time_point=START + datetime.timedelta(seconds=2), symbol='B', price=2.5, size=3, flag=False,
+                side='buy', level=1, bucket=10)]
+
+
+def assert_frame_like_to_dataframe(df, items):
+    import pandas
+    from pinform import MeasurementUtils
+    expected = MeasurementUtils.to_dataframe(items)
+    expected.index = pandas.DatetimeIndex(expected.index).as_unit('ns')
+    pandas.testing.assert_frame_equal(df, expected, check_categorical=False)
+    for column in ('side', 'level', 'bucket'):
+        assert list(df[column].cat.categories) == list(expected[column].cat.categories)
@@ -0,0 +1,45 @@
+import datetime
+
+import pytz
+
+from pinform import Measurement
+from pinform.cache import LatestValueCache
+from pinform.fields import FloatField
+from pinform.tags import Tag
+
+
+class Price(Measurement):
+    class Meta:
+        measurement_name = 'price'
+
+    symbol = Tag(null=False)
+    value = FloatField(null=False)
+
+
+START = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+def test_stored_and_returned_points_are_copies():
+    cache = LatestValueCache()
+    cache.track('price')
+    item = Price(time_point=START, symbol='AAPL', value=1.0)
+    cache.update(item)
+
+    item.value = 2.0
+    returned = cache.get('price', {'symbol': 'AAPL'})
+    assert returned.value == 1.0 and returned is not item
+    returned.value = 3.0
+    assert cache.get('price', {'symbol': 'AAPL'}).value == 1.0
+    assert cache.get_all('price')[0].value == 1.0
+
+
+def test_miss_expires_and_is_cleared_by_matching_point():
+    cache = LatestValueCache(max_age=60.0)
+    cache.track('price')
+    cache.add_miss('price', {'symbol': 'AAPL'})
+    assert cache.is_miss('price', {'symbol': 'AAPL'})
+    assert not cache.is_miss('price', {'symbol': 'MSFT'})
+    assert not cache.is_miss('price', {'symbol': 'AAPL'}, max_age=-1.0)
+
+    cache.update(Price(time_point=START, symbol='AAPL', value=1.0))
+    assert not cache.is_miss('price', {'symbol': 'AAPL'})
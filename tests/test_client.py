@@ -0,0 +1,294 @@
+import datetime
+
+import pytest
+import pytz
+
+from pinform import Measurement, MeasurementUtils
+from pinform.client import InfluxClient, AggregationMode, FillMode
+from pinform.fields import FloatField, IntegerField
+from pinform.tags import Tag
+from tests.influx_stub import InfluxStubServer
+
+
+class Quote(Measurement):
+    class Meta:
+        measurement_name = 'quote'
+
+    symbol = Tag(null=False)
+    bid = FloatField(null=False)
+    ask = FloatField(null=True)
+
+
+class Trade(Measurement):
+    class Meta:
+        measurement_name = 'trade'
+
+    symbol = Tag(null=False)
+    price = FloatField(null=False)
+    size = IntegerField(null=False)
+
+
+START = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+@pytest.fixture
+def server():
+    stub = InfluxStubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def client(server):
+    influx_client = InfluxClient(port=server.port, database_name='test')
+    yield influx_client
+    influx_client.close()
+
+
+def make_quotes(bids):
+    return [Quote(time_point=START + datetime.timedelta(minutes=i), symbol='AAPL', bid=bid, ask=bid + 0.5)
+            for i, bid in enumerate(bids)]
+
+
+def test_skip_unchanged_writes_only_changed_points(client, server):
+    client.save_points(make_quotes([1.0, 2.0, 3.0]))
+    quotes = make_quotes([1.0, 2.5, 3.0]) + [Quote(time_point=START + datetime.timedelta(minutes=3), symbol='AAPL', bid=4.0)]
+
+    client.save_points(quotes, mode='skip_unchanged', hash_window=datetime.timedelta(hours=1))
+    written = server.points[3:]
+    assert [(p['time'], p['fields']) for p in written] == [
+        (int((START + datetime.timedelta(minutes=1)).timestamp()) * 1000000000, {'bid': 2.5, 'ask': 3.0}),
+        (int((START + datetime.timedelta(minutes=3)).timestamp()) * 1000000000, {'bid': 4.0})]
+
+
+def test_skip_unchanged_compares_values_not_hashes(client, server):
+    # -1.0 and -2.0 have the same hash in CPython, so points differing only in them have equal content hashes
+    client.save_points([Quote(time_point=START, symbol='AAPL', bid=-1.0, ask=1.0)])
+    client.save_points([Quote(time_point=START, symbol='AAPL', bid=-2.0, ask=1.0)], mode='skip_unchanged',
+                       hash_window=datetime.timedelta(hours=1))
+    assert [p['fields']['bid'] for p in server.points] == [-1.0, -2.0]
+
+
+def count_selects(server):
+    return len([s for s in server.statements if s.startswith('SELECT')])
+
+
+def test_get_latest_takes_tags_dict_and_caches_misses(client, server):
+    client.save_points(make_quotes([1.0, 2.0]))
+
+    latest = client.get_latest(Quote, tags={'symbol': 'AAPL'})
+    assert latest.bid == 2.0 and latest.time_point == START + datetime.timedelta(minutes=1)
+    assert client.get_latest(Quote, tags={'symbol': 'MSFT'}) is None
+    selects = count_selects(server)
+    assert client.get_latest(Quote, tags={'symbol': 'MSFT'}) is None
+    assert client.get_latest(Quote, tags={'symbol': 'AAPL'}).bid == 2.0
+    assert count_selects(server) == selects
+
+    # a saved point of a missing series replaces the miss
+    client.save_points([Quote(time_point=START, symbol='MSFT', bid=5.0)])
+    assert client.get_latest(Quote, tags={'symbol': 'MSFT'}).bid == 5.0
+    assert count_selects(server) == selects
+
+
+def test_save_points_updates_cache_once_per_series(client, monkeypatch):
+    client.latest_cache.track('quote')
+    updates = []
+    cache_update = client.latest_cache.update
+    monkeypatch.setattr(client.latest_cache, 'update',
+                        lambda item, **kwargs: updates.append(item) or cache_update(item, **kwargs))
+
+    # newest point of AAPL comes first
+    quotes = make_quotes([5.0, 1.0, 2.0])[::-1] + [Quote(time_point=START, symbol='MSFT', bid=7.0)]
+    client.save_points(quotes)
+    assert sorted((q.symbol, q.bid) for q in updates) == [('AAPL', 2.0), ('MSFT', 7.0)]
+    assert client.get_latest(Quote, tags={'symbol': 'AAPL'}).bid == 2.0
+
+
+def test_save_dataframe_writes_to_retention_policy(client, monkeypatch):
+    policies = []
+    write_points = client.db_client.write_points
+
+    def record_write(points, **kwargs):
+        policies.append(kwargs.get('retention_policy'))
+        return write_points(points, **kwargs)
+
+    monkeypatch.setattr(client.db_client, 'write_points', record_write)
+    client.save_dataframe(MeasurementUtils.to_dataframe(make_quotes([1.0])), Quote, retention_policy='one_week')
+    assert policies == ['one_week']
+
+
+def test_get_latest_decodes_series_without_some_tags(client, server):
+    class Tick(Measurement):
+        class Meta:
+            measurement_name = 'tick'
+
+        symbol = Tag(null=False)
+        venue = Tag(null=True)
+        price = FloatField(null=False)
+
+    client.save_points([Tick(time_point=START, symbol='AAPL', price=1.0)])
+    client.latest_cache.clear()
+    latest = client.get_latest(Tick, tags={'symbol': 'AAPL'})
+    assert latest.price == 1.0 and latest.venue is None
+
+
+def test_copy_resumes_from_checkpoint_of_same_copy_only(client, server, tmp_path):
+    client.save_points(make_quotes([float(i) for i in range(30)]))
+    target = InfluxStubServer()
+    try:
+        dst = InfluxClient(port=target.port, database_name='test')
+        checkpoint_path = str(tmp_path / 'copy.json')
+        time_range = (START, START + datetime.timedelta(minutes=30))
+        interval = datetime.timedelta(minutes=10)
+
+        assert client.copy(Quote, time_range, dst=dst, chunk_interval=interval, checkpoint_path=checkpoint_path) == 30
+        assert sorted(p['fields']['bid'] for p in target.points) == [float(i) for i in range(30)]
+
+        selects = count_selects(server)
+        assert client.copy(Quote, time_range, dst=dst, chunk_interval=interval, checkpoint_path=checkpoint_path) == 0
+        assert count_selects(server) == selects
+
+        # another chunk interval or time range does not match the checkpoint, so the copy starts over
+        assert client.copy(Quote, time_range, dst=dst, chunk_interval=datetime.timedelta(minutes=5),
+                           checkpoint_path=checkpoint_path) == 30
+        assert client.copy(Quote, (START, START + datetime.timedelta(minutes=20)), dst=dst, chunk_interval=interval,
+                           checkpoint_path=checkpoint_path) == 20
+        dst.close()
+    finally:
+        target.close()
+
+
+def test_planned_load_with_open_time_range_falls_back_to_one_query(client, server):
+    client.save_points(make_quotes([1.0, 2.0, 3.0]))
+    selects = count_selects(server)
+
+    loaded = client.load_points(Quote, time_range=(START + datetime.timedelta(minutes=1), None), planned=True)
+    assert [q.bid for q in loaded] == [2.0, 3.0]
+    assert count_selects(server) == selects + 1
+
+
+def test_planned_and_bounded_loads_raise_inside_batch(client, server):
+    time_range = (START, START + datetime.timedelta(hours=1))
+    with client.batch():
+        with pytest.raises(Exception, match='batch'):
+            client.load_points(Quote, time_range=time_range, planned=True)
+        with pytest.raises(Exception, match='batch'):
+            client.load_points(Quote, time_range=time_range, max_memory=1000000)
+        with pytest.raises(Exception, match='batch'):
+            client.load_points_as_dataframe(Quote, time_range=time_range, max_memory=1000000)
+        pending = client.load_points(Quote, time_range=(START, None), planned=True)
+    assert pending.result() == []
+
+
+def test_batch_sends_one_request_and_decodes_each_call(client, server):
+    client.save_points(make_quotes([1.0, 2.0, 3.0]) + [Quote(time_point=START, symbol='MSFT', bid=7.0)])
+    statements = len(server.statements)
+
+    with client.batch():
+        points = client.load_points(Quote, tags={'symbol': 'AAPL'})
+        df = client.load_points_as_dataframe(Quote, tags={'symbol': 'MSFT'})
+        series = client.get_fields_as_series(Quote, {'bid': [AggregationMode.COUNT, AggregationMode.MAX]},
+                                             group_by_time_interval='1m', fill_mode=FillMode.NONE,
+                                             time_range=(START, START + datetime.timedelta(hours=1)))
+        symbols = client.get_distinct_existing_tag_values('symbol', measurement=Quote)
+        assert not points.done()
+
+    assert len(server.statements) == statements + 4
+    assert [q.bid for q in points.result()] == [1.0, 2.0, 3.0]
+    assert list(df.result()['bid']) == [7.0]
+    assert list(series.result()['count_bid']) == [2, 1, 1] and list(series.result()['max_bid']) == [7.0, 2.0, 3.0]
+    assert sorted(symbols.result()) == ['AAPL', 'MSFT']
+
+
+def test_execute_many_returns_results_in_order(client):
+    client.save_points(make_quotes([1.0, 2.0]))
+    points, symbols = client.execute_many([lambda: client.load_points(Quote),
+                                           lambda: client.get_distinct_existing_tag_values('symbol', measurement=Quote)])
+    assert [q.bid for q in points] == [1.0, 2.0] and symbols == ['AAPL']
+
+
+def test_batch_raises_on_result_count_mismatch(client, monkeypatch):
+    db_query = client.db_client.query
+    # the database answers only the first statement
+    monkeypatch.setattr(client.db_client, 'query', lambda query_string: db_query(query_string.split(';')[0]))
+    with pytest.raises(Exception, match='Expected 2 statement results'):
+        with client.batch():
+            client.load_points(Quote)
+            client.load_points(Quote, tags={'symbol': 'AAPL'})
+
+
+def test_exception_inside_batch_leaves_queries_pending(client, server):
+    statements = len(server.statements)
+    with pytest.raises(ValueError):
+        with client.batch():
+            pending = client.load_points(Quote)
+            raise ValueError('stop')
+    assert not pending.done()
+    assert len(server.statements) == statements
+    # the failed batch is no longer active
+    assert isinstance(client.load_points(Quote), list)
+
+
+def test_nested_batch_restores_outer_batch(client, server):
+    client.save_points(make_quotes([1.0]))
+    with client.batch() as outer:
+        first = client.load_points(Quote)
+        with client.batch():
+            inner = client.load_points(Quote)
+        assert inner.done() and not first.done()
+        second = client.load_points(Quote)
+        assert outer.pending_queries[-1] is second
+    assert [q.bid for q in first.result()] == [1.0] and [q.bid for q in second.result()] == [1.0]
+
+
+def save_aligned_points(client):
+    # AAPL quotes every minute of the range, AAPL trades before the range, before the chunk boundary at minute 10 and
+    # after it, and one MSFT quote and trade
+    quotes = make_quotes([float(i) for i in range(20)]) + [
+        Quote(time_point=START + datetime.timedelta(minutes=9), symbol='MSFT', bid=50.0)]
+    trades = [Trade(time_point=START + datetime.timedelta(minutes=minute), symbol='AAPL', price=price, size=minute + 2)
+              for minute, price in [(-1, 100.0), (8, 108.0), (15, 115.0)]]
+    trades.append(Trade(time_point=START + datetime.timedelta(minutes=9), symbol='MSFT', price=209.0, size=1))
+    client.save_points(quotes + trades)
+
+
+def load_aligned_rows(client, **kwargs):
+    return [row for rows in client.load_aligned([Quote, Trade], time_range=(START, START + datetime.timedelta(minutes=20)),
+                                                by=['symbol'], chunk_interval=datetime.timedelta(minutes=10), **kwargs)
+            for row in rows]
+
+
+def test_load_aligned_asof_matches_within_tolerance_across_chunks(client):
+    save_aligned_points(client)
+    rows = load_aligned_rows(client, tolerance=datetime.timedelta(minutes=3))
+
+    matched = [(q.symbol, int((t - START).total_seconds()) // 60, None if m is None else m.price) for t, q, m in rows]
+    expected_aapl = {0: 100.0, 1: 100.0, 2: 100.0, 8: 108.0, 9: 108.0, 10: 108.0, 11: 108.0,
+                     15: 115.0, 16: 115.0, 17: 115.0, 18: 115.0}
+    assert [m for m in matched if m[0] == 'AAPL'] == [('AAPL', minute, expected_aapl.get(minute)) for minute in range(20)]
+    # the trade at the same time matches, the AAPL trade before it does not
+    assert [m for m in matched if m[0] == 'MSFT'] == [('MSFT', 9, 209.0)]
+    assert [t for t, _, _ in rows] == sorted(t for t, _, _ in rows)
+
+
+def test_load_aligned_exact_matches_equal_time_points_only(client):
+    save_aligned_points(client)
+    rows = load_aligned_rows(client, mode='exact')
+
+    assert [(q.symbol, m.price) for t, q, m in rows if m is not None] == [('AAPL', 108.0), ('MSFT', 209.0), ('AAPL', 115.0)]
+    assert all(m.time_point == t for t, _, m in rows if m is not None)
+
+
+def test_load_aligned_as_dataframe_columns_and_dtypes(client):
+    save_aligned_points(client)
+    df = client.load_aligned_as_dataframe([Quote, Trade], time_range=(START, START + datetime.timedelta(minutes=20)),
+                                          by=['symbol'], tolerance=datetime.timedelta(minutes=3),
+                                          chunk_interval=datetime.timedelta(minutes=10))
+
+    assert len(df) == 21 and df.index.is_monotonic_increasing
+    assert str(df[('Quote', 'bid')].dtype) == 'float64' and str(df[('Trade', 'price')].dtype) == 'float64'
+    assert str(df[('Trade', 'size')].dtype) == 'Int64'
+    # tag columns of all batches share one set of categories
+    assert str(df[('Quote', 'symbol')].dtype) == 'category' and str(df[('Trade', 'symbol')].dtype) == 'category'
+    assert sorted(df[('Quote', 'symbol')].cat.categories) == ['AAPL', 'MSFT']
+    assert df[('Trade', 'price')].isna().sum() == 9 and df[('Trade', 'size')].isna().sum() == 9
@@ -0,0 +1,9 @@
+import os
+import subprocess
+import sys
+
+
+def test_importing_pinform_does_not_import_pandas():
+    code = 'import sys, pinform, pinform.writers, pinform.client, pinform.sharding, pinform.ingest; ' \
+           'assert "pandas" not in sys.modules, "pandas imported"'
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import io
+import os
+
+import pandas
+
+from pinform.ingest import iter_file_chunks, IngestCheckpoint
+
+
+def write_csv(tmp_path, content: str) -> str:
+    path = os.path.join(str(tmp_path), 'data.csv')
+    with open(path, 'w', newline='') as f:
+        f.write(content)
+    return path
+
+
+def test_csv_chunks_keep_quoted_newlines_in_one_record(tmp_path):
+    path = write_csv(tmp_path, 'time_point,symbol,note\n'
+                               '2020-01-01T00:00:00Z,AAPL,"first\nline"\n'
+                               '2020-01-01T00:00:01Z,AAPL,"say ""hi""\nagain"\n'
+                               '2020-01-01T00:00:02Z,MSFT,plain\n')
+    chunks = list(iter_file_chunks(path, chunk_size=2))
+    assert [index for index, _ in chunks] == [0, 1]
+    first = pandas.read_csv(io.StringIO(chunks[0][1]))
+    second = pandas.read_csv(io.StringIO(chunks[1][1]))
+    assert list(first['note']) == ['first\nline', 'say "hi"\nagain']
+    assert list(second['symbol']) == ['MSFT']
+
+
+def test_checkpoint_resets_on_other_chunk_size(tmp_path):
+    path = write_csv(tmp_path, 'time_point,symbol\n2020-01-01T00:00:00Z,AAPL\n')
+    checkpoint = IngestCheckpoint(path, chunk_size=100)
+    checkpoint.advance(100)
+    checkpoint.advance(100)
+
+    assert IngestCheckpoint(path, chunk_size=100).completed_chunks == 2
+    assert IngestCheckpoint(path, chunk_size=1000).completed_chunks == 0
+
+
+def test_checkpoint_resets_when_file_changed(tmp_path):
+    path = write_csv(tmp_path, 'time_point,symbol\n2020-01-01T00:00:00Z,AAPL\n')
+    IngestCheckpoint(path, chunk_size=100).advance(1)
+    with open(path, 'a') as f:
+        f.write('2020-01-01T00:00:01Z,MSFT\n')
+
+    assert IngestCheckpoint(path, chunk_size=100).completed_chunks == 0
+
+
+def test_bulk_ingest_writes_all_chunks_and_checkpoints(tmp_path):
+    from pinform.ingest import BulkIngest
+    from tests.influx_stub import InfluxStubServer
+
+    rows = ''.join('2020-01-01T00:00:%02dZ,S%d,%d.5\n' % (i, i % 3, i) for i in range(25))
+    path = write_csv(tmp_path, 'time_point,symbol,price\n' + rows)
+    server = InfluxStubServer()
+    try:
+        ingest = BulkIngest('tests.models:Row', client_kwargs={'port': server.port, 'database_name': 'test'},
+                            workers=2, writers=2, chunk_size=4)
+        summary = ingest.run([path])
+        assert summary['rows'] == 25
+        assert sorted(p['fields']['price'] for p in server.points) == [i + 0.5 for i in range(25)]
+        assert IngestCheckpoint(path, chunk_size=4).completed_chunks == 7
+    finally:
+        server.close()
@@ -0,0 +1,105 @@
+import datetime
+
+import pandas
+import pytest
+
+from pinform.client import InfluxClient, AggregationMode, FillMode
+from pinform.planner import QueryPlanner, DecodeMode
+from pinform.utils import _EPOCH
+from tests.influx_stub import InfluxStubServer
+from tests.test_client import Quote, START, make_quotes, count_selects
+
+# a quote every minute from START up to and including the end of the time range
+TIME_RANGE = (START, START + datetime.timedelta(minutes=300))
+
+
+@pytest.fixture
+def server():
+    stub = InfluxStubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def client(server):
+    influx_client = InfluxClient(port=server.port, database_name='test')
+    influx_client.save_points(make_quotes([float(i) for i in range(301)]))
+    influx_client._planner = QueryPlanner(influx_client, target_rows_per_chunk=50, columnar_threshold=100)
+    yield influx_client
+    influx_client.close()
+
+
+def test_plan_cuts_chunks_at_slice_bounds(client):
+    plan = client.planner.plan_load_points(Quote, time_range=TIME_RANGE)
+
+    # one minute slices of one point each, the last chunk takes the slice of the inclusive end
+    assert [chunk.start for chunk in plan.chunks] == [START + datetime.timedelta(minutes=m) for m in range(0, 300, 50)]
+    assert [chunk.end for chunk in plan.chunks] == [START + datetime.timedelta(minutes=m) for m in range(50, 301, 50)]
+    assert [chunk.estimated_rows for chunk in plan.chunks] == [50] * 5 + [51]
+    assert [chunk.last for chunk in plan.chunks] == [False] * 5 + [True]
+    assert plan.stats.series_cardinality == 1 and plan.concurrency == 6 and not plan.stats_cached
+    assert client.planner.plan_load_points(Quote, time_range=TIME_RANGE).stats_cached
+
+
+def test_planned_load_equals_unplanned_load(client, server):
+    selects = count_selects(server)
+    planned = client.load_points(Quote, time_range=TIME_RANGE, planned=True)
+    # statistics query and one query per chunk
+    assert count_selects(server) == selects + 7
+
+    unplanned = client.load_points(Quote, time_range=TIME_RANGE)
+    assert [(q.time_point, q.bid, q.ask) for q in planned] == [(q.time_point, q.bid, q.ask) for q in unplanned]
+    # points on chunk bounds are neither duplicated nor lost
+    assert [q.bid for q in planned] == [float(i) for i in range(301)]
+
+
+@pytest.mark.parametrize('columnar_threshold, decode_mode', [(100, DecodeMode.COLUMNAR), (1000, DecodeMode.OBJECT)])
+def test_planned_dataframe_equals_unplanned_dataframe(client, columnar_threshold, decode_mode):
+    client.planner.columnar_threshold = columnar_threshold
+    assert client.planner.plan_load_points(Quote, time_range=TIME_RANGE, as_dataframe=True).decode_mode == decode_mode
+
+    planned = client.load_points_as_dataframe(Quote, time_range=TIME_RANGE, planned=True)
+    unplanned = client.load_points_as_dataframe(Quote, time_range=TIME_RANGE)
+    pandas.testing.assert_frame_equal(planned, unplanned)
+
+
+@pytest.mark.parametrize('fill_mode', [FillMode.NONE, FillMode.NULL])
+def test_planned_fields_query_keeps_windows_whole(client, fill_mode):
+    time_range = (START + datetime.timedelta(minutes=3), START + datetime.timedelta(minutes=290))
+    plan = client.planner.plan_fields_query(Quote, time_range=time_range, group_by_time_interval='7m')
+    assert len(plan.chunks) > 1
+    # bounds between chunks are window starts, so no window is split between two chunks
+    assert all((chunk.start - _EPOCH) % datetime.timedelta(minutes=7) == datetime.timedelta(0) for chunk in plan.chunks[1:])
+
+    field_aggregations = {'bid': [AggregationMode.COUNT, AggregationMode.SUM]}
+    planned = client.get_fields_as_series(Quote, field_aggregations, group_by_time_interval='7m', fill_mode=fill_mode,
+                                          time_range=time_range, planned=True)
+    unplanned = client.get_fields_as_series(Quote, field_aggregations, group_by_time_interval='7m', fill_mode=fill_mode,
+                                            time_range=time_range)
+    for name in ('count_bid', 'sum_bid'):
+        assert planned[name].index.is_unique
+        pandas.testing.assert_series_equal(planned[name], unplanned[name])
+
+
+def test_concurrency_is_capped_by_series_cardinality(client):
+    client.save_points([Quote(time_point=START, symbol=symbol, bid=1.0) for symbol in ('MSFT', 'IBM')])
+    client.planner.max_concurrent_series = 2
+
+    plan = client.planner.plan_load_points(Quote, time_range=TIME_RANGE)
+    assert plan.stats.series_cardinality == 3 and plan.concurrency == 1
+    plan = client.planner.plan_load_points(Quote, time_range=TIME_RANGE, tags={'symbol': 'AAPL'})
+    assert plan.stats.series_cardinality == 1 and plan.concurrency == 2
+
+
+def test_explain_describes_plan(client):
+    plan = client.planner.plan_load_points(Quote, time_range=TIME_RANGE, tags={'symbol': 'AAPL'})
+    lines = plan.explain(max_chunks=2).splitlines()
+
+    assert lines[0] == 'plan for quote symbol=AAPL'
+    assert '  series cardinality: 1' in lines and '  estimated rows: 301' in lines
+    assert lines[3].startswith('  statistics: 301 slices of 1m, collected')
+    assert lines[6:] == ['    [0] 2020-01-01T00:00:00+00:00 .. 2020-01-01T00:50:00+00:00 exclusive  ~50 rows',
+                         '    [1] 2020-01-01T00:50:00+00:00 .. 2020-01-01T01:40:00+00:00 exclusive  ~50 rows',
+                         '    ... 3 more',
+                         '    [5] 2020-01-01T04:10:00+00:00 .. 2020-01-01T05:00:00+00:00 inclusive  ~51 rows']
+    assert 'cached' in client.planner.plan_load_points(Quote, time_range=TIME_RANGE, tags={'symbol': 'AAPL'}).explain()
@@ -0,0 +1,155 @@
+import datetime
+
+import pandas
+import pytest
+import pytz
+
+from pinform import Measurement
+from pinform.client import InfluxClient, AggregationMode, FillMode
+from pinform.fields import FloatField, IntegerField
+from pinform.sharding import HashRing, ShardedInfluxClient
+from pinform.tags import Tag
+from tests.influx_stub import InfluxStubServer
+
+
+class Trade(Measurement):
+    class Meta:
+        measurement_name = 'trade'
+
+    symbol = Tag(null=False)
+    price = FloatField(null=False)
+    volume = IntegerField(null=False)
+
+
+START = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+SYMBOLS = ['SYM%02d' % i for i in range(30)]
+
+
+@pytest.fixture
+def servers():
+    started = [InfluxStubServer() for _ in range(4)]
+    yield started
+    for server in started:
+        server.close()
+
+
+@pytest.fixture
+def client(servers):
+    # shard 0 and 1 on one node each, shard 2 replicated on two nodes
+    nodes = [{'port': servers[0].port}, {'port': servers[1].port}, [{'port': servers[2].port}, {'port': servers[3].port}]]
+    sharded_client = ShardedInfluxClient(nodes=nodes, shard_tag='symbol', database_name='test')
+    yield sharded_client
+    sharded_client.close()
+
+
+def make_trades():
+    trades = []
+    for i, symbol in enumerate(SYMBOLS):
+        for minute in range(i % 5 + 1):
+            trades.append(Trade(time_point=START + datetime.timedelta(minutes=minute + i % 3, seconds=i),
+                                symbol=symbol, price=float(i * 10 + minute), volume=i + minute))
+    return trades
+
+
+def test_ring_routing_is_stable_when_adding_and_removing_shards():
+    keys = ['key-' + str(i) for i in range(5000)]
+    ring4 = HashRing(4)
+    ring5 = HashRing(5)
+    before = {key: ring4.get_shard(key) for key in keys}
+    after = {key: ring5.get_shard(key) for key in keys}
+
+    moved = [key for key in keys if before[key] != after[key]]
+    # keys only move to the added shard, about a fifth of them
+    assert all(after[key] == 4 for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.3
+    # removing the shard again moves back exactly the keys it owned
+    assert {key: HashRing(4).get_shard(key) for key in keys} == before
+
+
+def test_save_points_routes_by_shard_tag_and_writes_every_replica(client, servers):
+    trades = make_trades()
+    assert client.save_points(trades)
+
+    stored_symbols = [{p['tags']['symbol'] for p in server.points} for server in servers]
+    for symbol in SYMBOLS:
+        shard_index = client.get_shard_index(symbol)
+        owners = [0] if shard_index == 0 else [1] if shard_index == 1 else [2, 3]
+        assert [i for i, symbols in enumerate(stored_symbols) if symbol in symbols] == owners
+    assert sorted(map(str, servers[2].points), key=str) == sorted(map(str, servers[3].points), key=str)
+    assert sum(len(server.points) for server in servers[:3]) == len(trades)
+
+
+def test_load_points_with_shard_tag_queries_owning_shard_only(client, servers):
+    client.save_points(make_trades())
+    symbol = next(s for s in SYMBOLS if client.get_shard_index(s) == 1)
+
+    loaded = client.load_points(Trade, tags={'symbol': symbol})
+    assert [t.symbol for t in loaded] == [symbol] * len(loaded) and len(loaded) > 0
+    assert any(s.startswith('SELECT') for s in servers[1].statements)
+    assert not any(s.startswith('SELECT') for s in servers[0].statements + servers[2].statements + servers[3].statements)
+
+
+def test_fan_out_load_points_merges_by_time_with_limit(client):
+    trades = make_trades()
+    client.save_points(trades)
+
+    loaded = client.load_points(Trade, limit=10)
+    expected = sorted(trades, key=lambda t: t.time_point)[:10]
+    assert [(t.time_point, t.symbol) for t in loaded] == [(t.time_point, t.symbol) for t in expected]
+
+
+@pytest.mark.parametrize('limit', [None, 2, 4])
+def test_fan_out_merges_aggregations(client, limit):
+    trades = make_trades()
+    client.save_points(trades)
+
+    result = client.get_fields_as_series(
+        Trade, {'price': [AggregationMode.MIN, AggregationMode.MAX], 'volume': [AggregationMode.COUNT, AggregationMode.SUM]},
+        group_by_time_interval='1m', fill_mode=FillMode.NONE, limit=limit,
+        time_range=(START, START + datetime.timedelta(hours=1)))
+
+    windows = {}
+    for t in trades:
+        windows.setdefault(t.time_point.replace(second=0), []).append(t)
+    window_starts = sorted(windows)[:limit]
+    assert list(result['min_price'].index) == window_starts
+    assert list(result['min_price']) == [min(t.price for t in windows[w]) for w in window_starts]
+    assert list(result['max_price']) == [max(t.price for t in windows[w]) for w in window_starts]
+    assert list(result['count_volume']) == [len(windows[w]) for w in window_starts]
+    assert list(result['sum_volume']) == [sum(t.volume for t in windows[w]) for w in window_starts]
+
+
+def test_fan_out_rejects_unmergeable_aggregation_and_max_memory(client):
+    with pytest.raises(Exception):
+        client.get_fields_as_series(Trade, {'price': [AggregationMode.MEAN]}, group_by_time_interval='1m')
+    with pytest.raises(Exception):
+        client.load_points(Trade, max_memory=1000000)
+
+
+@pytest.mark.parametrize('fill_mode, fill_number', [(FillMode.NUMBER, 0), (FillMode.PREVIOUS, None), (FillMode.LINEAR, None)])
+def test_fan_out_applies_fill_after_merging(client, fill_mode, fill_number):
+    # points in a few windows only, spread over shards, so most shards have no points in most windows
+    trades = [Trade(time_point=START + datetime.timedelta(minutes=minute, seconds=i), symbol=SYMBOLS[i],
+                    price=float(10 + i + minute), volume=i + 1)
+              for minute in (0, 3, 4, 8) for i in range(0, 30, 7)]
+    client.save_points(trades)
+    single_node = InfluxStubServer()
+    try:
+        single_client = InfluxClient(port=single_node.port, database_name='test')
+        single_client.save_points(trades)
+        kwargs = dict(field_aggregations={'price': [AggregationMode.MIN, AggregationMode.MAX],
+                                          'volume': [AggregationMode.COUNT, AggregationMode.SUM]},
+                      group_by_time_interval='1m', fill_mode=fill_mode, fill_number=fill_number,
+                      time_range=(START, START + datetime.timedelta(minutes=10)))
+        merged = client.get_fields_as_series(Trade, **kwargs)
+        expected = single_client.get_fields_as_series(Trade, **kwargs)
+        single_client.close()
+    finally:
+        single_node.close()
+
+    for name in ('min_price', 'max_price', 'count_volume', 'sum_volume'):
+        pandas.testing.assert_series_equal(merged[name], expected[name], check_dtype=False, check_names=False,
+                                           check_freq=False, check_index_type=False)
+    # the second window is empty on every shard
+    expected_fill = {FillMode.NUMBER: 0, FillMode.PREVIOUS: 10.0, FillMode.LINEAR: 11.0}[fill_mode]
+    assert merged['min_price'].iloc[1] == expected_fill
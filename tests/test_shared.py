@@ -0,0 +1,35 @@
+import pickle
+
+from pinform import MeasurementUtils
+from pinform.shared import export_to_shared_memory, attach_shared_memory
+from tests.models import Row, make_rows, assert_frame_like_to_dataframe
+
+
+def test_list_round_trip_keeps_nulls():
+    items = make_rows()
+    with export_to_shared_memory(items) as shared:
+        with attach_shared_memory(shared.descriptor) as attached:
+            assert_frame_like_to_dataframe(attached.to_dataframe(), items)
+            assert [attached[i].price for i in range(3)] == [1.5, None, 2.5]
+
+
+def test_dataframe_round_trip_keeps_nulls():
+    items = make_rows()
+    with export_to_shared_memory(MeasurementUtils.to_dataframe(items), Row) as shared:
+        with attach_shared_memory(shared.descriptor) as attached:
+            assert_frame_like_to_dataframe(attached.to_dataframe(), items)
+            assert [attached[i].bucket for i in range(3)] == [20, None, 10]
+
+
+def test_categories_are_stored_in_block_not_descriptor():
+    items = make_rows()
+    symbols = ['SYM%05d-é' % i for i in range(10000)]
+    for i, symbol in enumerate(symbols):
+        item = make_rows()[i % 3]
+        item.symbol = symbol
+        items.append(item)
+    with export_to_shared_memory(items) as shared:
+        assert len(pickle.dumps(shared.descriptor)) < 5000
+        with attach_shared_memory(shared.descriptor) as attached:
+            assert attached.categories['symbol'][-len(symbols):] == symbols
+            assert [attached[i].symbol for i in range(len(items))] == [item.symbol for item in items]
@@ -0,0 +1,14 @@
+from pinform.spill import SpillWriter
+from tests.models import Row, make_rows, assert_frame_like_to_dataframe
+
+
+def test_spilled_dataframe_matches_to_dataframe_with_nulls():
+    items = make_rows()
+    writer = SpillWriter(Row)
+    writer.append(items[:2])
+    writer.append(items[2:])
+    with writer.finish() as spilled:
+        df = spilled.to_dataframe()
+        assert_frame_like_to_dataframe(df, items)
+        assert df['price'].isna().tolist() == [False, True, False]
+        assert [spilled[i].price for i in range(3)] == [1.5, None, 2.5]
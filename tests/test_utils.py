@@ -0,0 +1,44 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pinform.utils import ChunkPipeline, JsonCheckpoint
+
+
+def test_chunk_pipeline_finishes_chunks_in_order_with_bounded_reads():
+    finished = []
+    submitted = []
+    consumed = []
+    max_pending_reads = [0]
+    max_pending_writes = [0]
+
+    def read(chunk: int) -> int:
+        time.sleep(random.random() / 200)
+        return chunk * 10
+
+    def submit_read(chunk: int):
+        submitted.append(chunk)
+        max_pending_reads[0] = max(max_pending_reads[0], len(submitted) - len(consumed))
+        return read_pool.submit(read, chunk)
+
+    def write(chunk: int, value: int):
+        consumed.append(chunk)
+        max_pending_writes[0] = max(max_pending_writes[0], len(consumed) - len(finished))
+        return [write_pool.submit(time.sleep, random.random() / 200) for _ in range(chunk % 3)], value
+
+    with ThreadPoolExecutor(max_workers=3) as read_pool, ThreadPoolExecutor(max_workers=2) as write_pool:
+        ChunkPipeline(submit_read, write, lambda chunk, value: finished.append((chunk, value)),
+                      max_reads=3, max_writes=2).run(range(50))
+
+    assert finished == [(i, i * 10) for i in range(50)]
+    assert max_pending_reads[0] == 3
+    assert max_pending_writes[0] == 2
+
+
+def test_json_checkpoint_discards_state_of_other_identity(tmp_path):
+    path = str(tmp_path / 'job.json')
+    JsonCheckpoint(path, {'job': 'a', 'range': [1, 2]}).save(done=3)
+
+    assert JsonCheckpoint(path, {'job': 'a', 'range': [1, 2]}).state == {'done': 3}
+    assert JsonCheckpoint(path, {'job': 'b', 'range': [1, 2]}).state == {}
+    assert JsonCheckpoint(path, {'job': 'a', 'range': [1, 3]}).state == {}
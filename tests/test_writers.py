@@ -0,0 +1,120 @@
+import datetime
+import statistics
+from enum import Enum
+
+import pytz
+
+from pinform import Measurement
+from pinform.client import AggregationMode
+from pinform.fields import FloatField, EnumIntegerField
+from pinform.tags import Tag
+from pinform.writers import AggregatingWriter
+
+
+class Level(Enum):
+    LOW = 1
+    HIGH = 2
+
+
+class Reading(Measurement):
+    class Meta:
+        measurement_name = 'reading'
+
+    sensor = Tag(null=False)
+    value = FloatField(null=False)
+    level = EnumIntegerField(enum=Level)
+
+
+class RecordingDBClient:
+    def __init__(self):
+        self.points = []
+
+    def write_points(self, points, **kwargs):
+        self.points.extend(points)
+        return True
+
+
+class RecordingClient:
+    def __init__(self):
+        self.db_client = RecordingDBClient()
+
+
+def test_enum_members_are_aggregated_as_values():
+    client = RecordingClient()
+    start = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+    with AggregatingWriter(client, Reading, window=datetime.timedelta(minutes=1),
+                           field_aggregations={'level': [AggregationMode.SUM, AggregationMode.FIRST, AggregationMode.LAST],
+                                               'value': [AggregationMode.MEAN]}) as writer:
+        writer.add(Reading(time_point=start, sensor='s1', value=1.0, level=Level.LOW))
+        writer.add(Reading(time_point=start + datetime.timedelta(seconds=10), sensor='s1', value=3.0, level=Level.HIGH))
+
+    assert len(client.db_client.points) == 1
+    fields = client.db_client.points[0]['fields']
+    assert fields == {'sum_level': 3, 'first_level': 1, 'last_level': 2, 'mean_value': 2.0}
+
+
+def at(seconds: float) -> datetime.datetime:
+    return datetime.datetime(2020, 1, 1, tzinfo=pytz.utc) + datetime.timedelta(seconds=seconds)
+
+
+def make_writer(client, **kwargs) -> AggregatingWriter:
+    return AggregatingWriter(client, Reading, window=datetime.timedelta(minutes=1),
+                             field_aggregations={'value': [AggregationMode.COUNT, AggregationMode.MEAN]}, **kwargs)
+
+
+def test_windows_close_by_watermark_with_one_point_per_series():
+    client = RecordingClient()
+    writer = make_writer(client)
+    writer.add_points([Reading(time_point=at(0), sensor='s1', value=1.0), Reading(time_point=at(30), sensor='s1', value=3.0),
+                       Reading(time_point=at(10), sensor='s2', value=5.0)])
+    assert client.db_client.points == []
+
+    writer.add(Reading(time_point=at(60), sensor='s1', value=7.0))
+    points = sorted(client.db_client.points, key=lambda p: p['tags']['sensor'])
+    assert [(p['measurement'], p['tags'], p['time'], p['fields']) for p in points] == [
+        ('reading', {'sensor': 's1'}, at(0), {'count_value': 2, 'mean_value': 2.0}),
+        ('reading', {'sensor': 's2'}, at(0), {'count_value': 1, 'mean_value': 5.0})]
+    assert writer.written_points == 2
+
+
+def test_allowed_lateness_keeps_window_open_and_late_points_are_dropped():
+    client = RecordingClient()
+    writer = make_writer(client, allowed_lateness=datetime.timedelta(seconds=30))
+    writer.add(Reading(time_point=at(0), sensor='s1', value=1.0))
+    writer.add(Reading(time_point=at(80), sensor='s1', value=2.0))
+    # the watermark is at 50s, so the first window still takes late points
+    writer.add(Reading(time_point=at(59), sensor='s1', value=3.0))
+    assert client.db_client.points == []
+
+    writer.add(Reading(time_point=at(95), sensor='s1', value=4.0))
+    assert [p['fields'] for p in client.db_client.points] == [{'count_value': 2, 'mean_value': 2.0}]
+    writer.add(Reading(time_point=at(5), sensor='s1', value=9.0))
+    assert writer.dropped_points == 1
+
+
+def test_close_flushes_open_windows_unless_disabled():
+    client = RecordingClient()
+    with make_writer(client) as writer:
+        writer.add(Reading(time_point=at(0), sensor='s1', value=1.0))
+    assert len(client.db_client.points) == 1
+
+    client = RecordingClient()
+    with make_writer(client, flush_on_close=False) as writer:
+        writer.add(Reading(time_point=at(0), sensor='s1', value=1.0))
+    assert client.db_client.points == []
+
+
+def test_median_stddev_and_spread():
+    client = RecordingClient()
+    with AggregatingWriter(client, Reading, window=datetime.timedelta(minutes=1),
+                           field_aggregations={'value': [AggregationMode.MEDIAN, AggregationMode.STDDEV,
+                                                         AggregationMode.SPREAD]}) as writer:
+        for i, value in enumerate([4.0, 1.0, 3.0, 2.0]):
+            writer.add(Reading(time_point=at(i), sensor='s1', value=value))
+        writer.add(Reading(time_point=at(70), sensor='s1', value=5.0))
+
+    first, second = client.db_client.points
+    assert first['fields']['median_value'] == 2.5 and first['fields']['spread_value'] == 3.0
+    assert abs(first['fields']['stddev_value'] - statistics.stdev([4.0, 1.0, 3.0, 2.0])) < 1e-12
+    # the sample standard deviation of one value is undefined, so it is not written
+    assert second['fields'] == {'median_value': 5.0, 'spread_value': 0.0}